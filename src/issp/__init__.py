@@ -1,6 +1,6 @@
 """Exported symbols."""
 
-from . import _log as log
+from . import _crack as crack, _log as log
 from ._authentication import (
     HMAC,
     SHA256,
@@ -12,14 +12,19 @@ from ._authentication import (
     RSASigner,
 )
 from ._biometric import biometric_template, euclidean_distance, euclidean_similarity
+from ._codec import BinaryCodec, Codec, JSONCodec
 from ._communication import (
     Actor,
     AntiReplayLayer,
+    AsyncChannel,
     BankServer,
     Channel,
     FileServer,
+    Frame,
+    FramedLayer,
     JSONMessage,
     Layer,
+    QueueChannel,
 )
 from ._encryption import (
     AES,
@@ -28,20 +33,34 @@ from ._encryption import (
     AsymmetricCipher,
     BlockCipher,
     Cipher,
+    CipherContext,
     DigitalEnvelope,
     EncryptionLayer,
     SymmetricCipher,
 )
-from ._functions import hmac_sha1, hmac_sha256, scrypt, scrypt_fast, sha1, sha256
+from ._functions import (
+    hmac_sha1,
+    hmac_sha1_context,
+    hmac_sha256,
+    hmac_sha256_context,
+    scrypt,
+    scrypt_fast,
+    sha1,
+    sha1_context,
+    sha256,
+    sha256_context,
+)
 from ._malware import DeleteFiles, Malware, Payload, Propagation, Ransomware, Scareware, StorageWorm
+from ._network import ConnectionPool, SocketChannel, SocketServer
 from ._password import (
+    PasswordDatabase,
     common_passwords,
     generate_password_database,
     random_common_password,
 )
 from ._random import LCG, RNG, TRNG, ANSIx917, CounterRNG, random_choice, random_int, random_string
 from ._system import Path, System
-from ._util import byte_size, xor, zero_pad
+from ._util import byte_size, xor, xor_into, zero_pad
 
 __all__ = [
     "AES",
@@ -57,39 +76,54 @@ __all__ = [
     "Actor",
     "AntiReplayLayer",
     "AsymmetricCipher",
+    "AsyncChannel",
     "AuthenticationLayer",
     "Authenticator",
     "BankServer",
+    "BinaryCodec",
     "BlockCipher",
     "Channel",
     "Cipher",
+    "CipherContext",
+    "Codec",
+    "ConnectionPool",
     "CounterRNG",
     "DeleteFiles",
     "DigitalEnvelope",
     "EncryptedHashMAC",
     "EncryptionLayer",
     "FileServer",
+    "Frame",
+    "FramedLayer",
+    "JSONCodec",
     "JSONMessage",
     "KeyedHashMAC",
     "Layer",
     "Malware",
+    "PasswordDatabase",
     "Path",
     "Payload",
     "Propagation",
+    "QueueChannel",
     "RSASigner",
     "Ransomware",
     "Scareware",
+    "SocketChannel",
+    "SocketServer",
     "StorageWorm",
     "SymmetricCipher",
     "System",
     "biometric_template",
     "byte_size",
     "common_passwords",
+    "crack",
     "euclidean_distance",
     "euclidean_similarity",
     "generate_password_database",
     "hmac_sha1",
+    "hmac_sha1_context",
     "hmac_sha256",
+    "hmac_sha256_context",
     "log",
     "random_choice",
     "random_common_password",
@@ -98,7 +132,10 @@ __all__ = [
     "scrypt",
     "scrypt_fast",
     "sha1",
+    "sha1_context",
     "sha256",
+    "sha256_context",
     "xor",
+    "xor_into",
     "zero_pad",
 ]
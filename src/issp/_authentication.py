@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import itertools
 import os
 from abc import ABC, abstractmethod
 from functools import cached_property
@@ -7,39 +8,60 @@ from typing import TYPE_CHECKING
 
 from cryptography.exceptions import InvalidSignature
 from cryptography.hazmat.primitives import hashes
-from cryptography.hazmat.primitives.asymmetric import padding, rsa
+from cryptography.hazmat.primitives.asymmetric import padding, rsa, utils
 
-from ._communication import Layer
-from ._functions import hmac_sha256, sha256
-from ._util import xor, zero_pad
+from ._communication import FramedLayer, Layer, view_to_bytes
+from ._functions import hmac_sha256, hmac_sha256_context, sha256, sha256_context
+from ._util import xor_into
 
 if TYPE_CHECKING:
+    from collections.abc import Iterable, Sequence
+
+    from ._communication import Frame
     from ._encryption import SymmetricCipher
+    from ._util import Buffer
 
 
-class AuthenticationLayer(Layer):
+class AuthenticationLayer(FramedLayer):
     def __init__(self, layer: Layer = None, auth: Authenticator = None) -> None:
         super().__init__(layer)
         self.auth = auth
 
-    def send(self, message: bytes) -> None:
-        code = self.auth.compute_code(message)
-        self.lower_layer.send(message + code)
-
-    def receive(self) -> bytes | None:
-        if (message := self.lower_layer.receive()) is None:
-            return None
-
-        fingerprint = message[-self.auth.code_size :]
-        message = message[: -self.auth.code_size]
+    def encode_frames(self, frames: Sequence[Frame]) -> Sequence[Frame]:
+        # Codes are computed over the segments, so the frames are not joined here.
+        for frame in frames:
+            frame.append(self.auth.compute_code_stream(frame.segments))
+        return frames
+
+    def decode_views(self, messages: list[memoryview]) -> list[memoryview]:
+        fingerprints = [message[-self.auth.code_size :].tobytes() for message in messages]
+        messages = [message[: -self.auth.code_size] for message in messages]
+
+        # Codes are verified over the views, so the payloads are not copied, unless the
+        # authenticator only overrides verify, which is only guaranteed to accept bytes.
+        if _verifies_bytes_only(self.auth):
+            payloads = [view_to_bytes(message) for message in messages]
+            valid = all(self.auth.verify_many(payloads, fingerprints))
+            messages = [memoryview(payload) for payload in payloads]
+        else:
+            valid = all(
+                self.auth.verify_stream((message,), fingerprint)
+                for message, fingerprint in zip(messages, fingerprints, strict=True)
+            )
 
-        if self.auth.verify(message, fingerprint):
-            return message
+        if valid:
+            return messages
 
         err_msg = "The message has been tampered with"
         raise ValueError(err_msg)
 
 
+def _verifies_bytes_only(auth: Authenticator) -> bool:
+    cls = type(auth)
+    overrides_verify = cls.verify is not Authenticator.verify
+    return overrides_verify and cls.verify_stream is Authenticator.verify_stream
+
+
 class Authenticator(ABC):
     @cached_property
     def code_size(self) -> int:
@@ -52,6 +74,18 @@ class Authenticator(ABC):
     def verify(self, message: bytes, code: bytes) -> bool:
         return code == self.compute_code(message)
 
+    def compute_code_stream(self, chunks: Iterable[Buffer]) -> bytes:
+        return self.compute_code(b"".join(chunks))
+
+    def verify_stream(self, chunks: Iterable[Buffer], code: bytes) -> bool:
+        return code == self.compute_code_stream(chunks)
+
+    def compute_codes(self, messages: Sequence[bytes]) -> list[bytes]:
+        return [self.compute_code(message) for message in messages]
+
+    def verify_many(self, messages: Sequence[bytes], codes: Sequence[bytes]) -> list[bool]:
+        return [self.verify(m, c) for m, c in zip(messages, codes, strict=True)]
+
 
 class EncryptedHashMAC(Authenticator):
     def __init__(self, auth: Authenticator, cipher: SymmetricCipher) -> None:
@@ -59,19 +93,32 @@ class EncryptedHashMAC(Authenticator):
         self.cipher = cipher
 
     def compute_code(self, message: bytes) -> bytes:
-        iv = os.urandom(self.cipher.iv_size) if self.cipher.iv_size else b""
-        return iv + self.cipher.encrypt(self.auth.compute_code(message), iv)
+        return self._encrypt_code(self.auth.compute_code(message))
 
     def verify(self, message: bytes, code: bytes) -> bool:
+        code = self._decrypt_code(code)
+        return code is not None and self.auth.verify(message, code)
+
+    def compute_code_stream(self, chunks: Iterable[Buffer]) -> bytes:
+        return self._encrypt_code(self.auth.compute_code_stream(chunks))
+
+    def verify_stream(self, chunks: Iterable[Buffer], code: bytes) -> bool:
+        code = self._decrypt_code(code)
+        return code is not None and self.auth.verify_stream(chunks, code)
+
+    def _encrypt_code(self, code: bytes) -> bytes:
+        iv = os.urandom(self.cipher.iv_size) if self.cipher.iv_size else b""
+        return iv + self.cipher.encrypt(code, iv)
+
+    def _decrypt_code(self, code: bytes) -> bytes | None:
         iv = None
         if self.cipher.iv_size:
             iv = code[: self.cipher.iv_size]
             code = code[self.cipher.iv_size :]
         try:
-            code = self.cipher.decrypt(code, iv)
+            return self.cipher.decrypt(code, iv)
         except ValueError:
-            return False
-        return self.auth.verify(message, code)
+            return None
 
 
 class KeyedHashMAC(Authenticator):
@@ -84,18 +131,32 @@ class KeyedHashMAC(Authenticator):
         self.key = key or os.urandom(self.code_size)
 
     def compute_code(self, message: bytes) -> bytes:
-        return self.auth.compute_code(self.key + message + self.key)
+        return self.compute_code_stream((message,))
+
+    def compute_code_stream(self, chunks: Iterable[Buffer]) -> bytes:
+        return self.auth.compute_code_stream(itertools.chain((self.key,), chunks, (self.key,)))
 
 
 class XOR(Authenticator):
     code_size = 8
 
     def compute_code(self, message: bytes) -> bytes:
-        message = zero_pad(message, self.code_size)
-        digest = bytes(self.code_size)
-        for i in range(0, len(message), self.code_size):
-            digest = xor(digest, message[i : i + self.code_size])
-        return digest
+        return self.compute_code_stream((message,))
+
+    def compute_code_stream(self, chunks: Iterable[Buffer]) -> bytes:
+        digest = bytearray(self.code_size)
+        target = memoryview(digest)
+        # Position in the current block, since chunks need not be block aligned.
+        offset = 0
+        for chunk in chunks:
+            chunk = memoryview(chunk)  # noqa: PLW2901
+            i = 0
+            while i < len(chunk):
+                block = chunk[i : i + self.code_size - offset]
+                xor_into(target[offset : offset + len(block)], block)
+                i += len(block)
+                offset = (offset + len(block)) % self.code_size
+        return bytes(digest)
 
 
 class SHA256(Authenticator):
@@ -104,6 +165,12 @@ class SHA256(Authenticator):
     def compute_code(self, message: bytes) -> bytes:
         return sha256(message)
 
+    def compute_code_stream(self, chunks: Iterable[Buffer]) -> bytes:
+        digest = sha256_context()
+        for chunk in chunks:
+            digest.update(chunk)
+        return digest.finalize()
+
 
 class HMAC(Authenticator):
     code_size = 32
@@ -112,7 +179,26 @@ class HMAC(Authenticator):
         self.key = key or os.urandom(self.code_size)
 
     def compute_code(self, message: bytes) -> bytes:
-        return hmac_sha256(self.key, message)
+        return hmac_sha256(message, self.key)
+
+    def compute_code_stream(self, chunks: Iterable[Buffer]) -> bytes:
+        mac = hmac_sha256_context(self.key)
+        for chunk in chunks:
+            mac.update(chunk)
+        return mac.finalize()
+
+    def compute_codes(self, messages: Sequence[bytes]) -> list[bytes]:
+        keyed = hmac_sha256_context(self.key)
+        codes = []
+        for message in messages:
+            mac = keyed.copy()
+            mac.update(message)
+            codes.append(mac.finalize())
+        return codes
+
+    def verify_many(self, messages: Sequence[bytes], codes: Sequence[bytes]) -> list[bool]:
+        computed = self.compute_codes(messages)
+        return [c == code for c, code in zip(computed, codes, strict=True)]
 
 
 class RSASigner(Authenticator):
@@ -121,6 +207,7 @@ class RSASigner(Authenticator):
         mgf=padding.MGF1(_hash),
         salt_length=padding.PSS.MAX_LENGTH,
     )
+    _prehashed = utils.Prehashed(_hash)
 
     def __init__(self, key: rsa.RSAPublicKey | rsa.RSAPrivateKey | None = None) -> None:
         if key is None:
@@ -145,3 +232,22 @@ class RSASigner(Authenticator):
         except InvalidSignature:
             return False
         return True
+
+    def compute_code_stream(self, chunks: Iterable[Buffer]) -> bytes:
+        if not self.private_key:
+            err_msg = "Cannot sign without a private key"
+            raise ValueError(err_msg)
+        return self.private_key.sign(self._digest(chunks), self._padding, self._prehashed)
+
+    def verify_stream(self, chunks: Iterable[Buffer], code: bytes) -> bool:
+        try:
+            self.public_key.verify(code, self._digest(chunks), self._padding, self._prehashed)
+        except InvalidSignature:
+            return False
+        return True
+
+    def _digest(self, chunks: Iterable[Buffer]) -> bytes:
+        digest = hashes.Hash(self._hash)
+        for chunk in chunks:
+            digest.update(chunk)
+        return digest.finalize()
@@ -0,0 +1,260 @@
+from __future__ import annotations
+
+import base64
+import json
+import struct
+from abc import ABC, abstractmethod
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+
+    from ._util import Buffer
+
+
+class Codec(ABC):
+    @abstractmethod
+    def encode(self, msg: object) -> bytes:
+        pass
+
+    @abstractmethod
+    def decode(self, data: Buffer) -> object:
+        pass
+
+    def try_encode(self, msg: bytes | object) -> bytes:
+        if isinstance(msg, bytes):
+            return msg
+        try:
+            return self.encode(msg)
+        except Exception:
+            return msg
+
+    def try_decode(self, msg: bytes | None) -> bytes | object | None:
+        try:
+            return None if msg is None else self.decode(msg)
+        except Exception:
+            return msg
+
+
+class _BytesFoundError(Exception):
+    pass
+
+
+def _reject_bytes(obj: object) -> object:
+    if isinstance(obj, bytes):
+        raise _BytesFoundError
+    err_msg = f"Object of type {type(obj).__name__} is not JSON serializable"
+    raise TypeError(err_msg)
+
+
+def _encode_bytes(obj: object) -> object:
+    # Replaces each bytes value with a "<key>_b64" base64 string.
+    if isinstance(obj, dict):
+        encoded = {}
+        for key, value in obj.items():
+            if isinstance(value, bytes):
+                encoded[f"{key}_b64"] = base64.b64encode(value).decode("ascii")
+            elif isinstance(value, dict | list | tuple):
+                encoded[key] = _encode_bytes(value)
+            else:
+                encoded[key] = value
+        return encoded
+    if isinstance(obj, list | tuple):
+        return [_encode_bytes(item) for item in obj]
+    return obj
+
+
+def _decode_bytes(obj: dict) -> dict:
+    for key in obj:
+        if key.endswith("_b64"):
+            break
+    else:
+        return obj
+    return {
+        key.removesuffix("_b64"): base64.b64decode(value) if key.endswith("_b64") else value
+        for key, value in obj.items()
+    }
+
+
+class JSONCodec(Codec):
+    # JSON, with bytes values sent as base64 strings under a "<key>_b64" key.
+
+    def __init__(self) -> None:
+        self._encoder = json.JSONEncoder()
+        self._plain_encoder = json.JSONEncoder(default=_reject_bytes)
+        self._decoder = json.JSONDecoder(object_hook=_decode_bytes)
+
+    def encode(self, msg: object) -> bytes:
+        # Messages without bytes go straight through the C encoder. A bytes value at the top
+        # level is the common case, and skips that attempt.
+        if not (isinstance(msg, dict) and any(isinstance(v, bytes) for v in msg.values())):
+            try:
+                return self._plain_encoder.encode(msg).encode()
+            except _BytesFoundError:
+                pass
+        return self._encoder.encode(_encode_bytes(msg)).encode()
+
+    def decode(self, data: Buffer) -> object:
+        return self._decoder.decode(str(data, "utf-8"))
+
+
+_MAGIC = b"\xb1"
+_LENGTH = struct.Struct("<I")
+_INT = struct.Struct("<q")
+_FLOAT = struct.Struct("<d")
+
+
+def _pack_none(_: None, out: list[Buffer]) -> None:
+    out.append(b"N")
+
+
+def _pack_bool(obj: bool, out: list[Buffer]) -> None:  # noqa: FBT001
+    out.append(b"T" if obj else b"F")
+
+
+def _pack_int(obj: int, out: list[Buffer]) -> None:
+    if -(2**63) <= obj < 2**63:
+        out += (b"i", _INT.pack(obj))
+    else:
+        data = obj.to_bytes((obj.bit_length() + 8) // 8, "little", signed=True)
+        out += (b"I", _LENGTH.pack(len(data)), data)
+
+
+def _pack_float(obj: float, out: list[Buffer]) -> None:
+    out += (b"f", _FLOAT.pack(obj))
+
+
+def _pack_str(obj: str, out: list[Buffer]) -> None:
+    data = obj.encode()
+    out += (b"s", _LENGTH.pack(len(data)), data)
+
+
+def _pack_bytes(obj: Buffer, out: list[Buffer]) -> None:
+    out += (b"b", _LENGTH.pack(len(obj)), obj)
+
+
+def _pack_list(obj: list | tuple, out: list[Buffer]) -> None:
+    out += (b"l", _LENGTH.pack(len(obj)))
+    for item in obj:
+        _pack(item, out)
+
+
+def _pack_dict(obj: dict, out: list[Buffer]) -> None:
+    out += (b"d", _LENGTH.pack(len(obj)))
+    for key, value in obj.items():
+        _pack_str(str(key), out)
+        _pack(value, out)
+
+
+# Looked up along the MRO, so that subclasses are packed like their base (and bool is
+# not packed as an int).
+_PACKERS: dict[type, Callable[[Any, list[Buffer]], None]] = {
+    type(None): _pack_none,
+    bool: _pack_bool,
+    int: _pack_int,
+    float: _pack_float,
+    str: _pack_str,
+    bytes: _pack_bytes,
+    bytearray: _pack_bytes,
+    memoryview: _pack_bytes,
+    list: _pack_list,
+    tuple: _pack_list,
+    dict: _pack_dict,
+}
+
+
+def _pack(obj: object, out: list[Buffer]) -> None:
+    for cls in type(obj).__mro__:
+        if (packer := _PACKERS.get(cls)) is not None:
+            packer(obj, out)
+            return
+    err_msg = f"Unsupported type: {type(obj).__name__}"
+    raise TypeError(err_msg)
+
+
+def _unpack_sized(view: memoryview, offset: int) -> tuple[memoryview, int]:
+    (length,) = _LENGTH.unpack_from(view, offset)
+    offset += _LENGTH.size
+    end = offset + length
+    if end > len(view):
+        err_msg = "Truncated message"
+        raise ValueError(err_msg)
+    return view[offset:end], end
+
+
+def _unpack_big_int(view: memoryview, offset: int) -> tuple[int, int]:
+    data, offset = _unpack_sized(view, offset)
+    return int.from_bytes(data, "little", signed=True), offset
+
+
+def _unpack_str(view: memoryview, offset: int) -> tuple[str, int]:
+    data, offset = _unpack_sized(view, offset)
+    return str(data, "utf-8"), offset
+
+
+def _unpack_bytes(view: memoryview, offset: int) -> tuple[bytes, int]:
+    data, offset = _unpack_sized(view, offset)
+    return data.tobytes(), offset
+
+
+def _unpack_list(view: memoryview, offset: int) -> tuple[list, int]:
+    (length,) = _LENGTH.unpack_from(view, offset)
+    offset += _LENGTH.size
+    items = []
+    for _ in range(length):
+        item, offset = _unpack(view, offset)
+        items.append(item)
+    return items, offset
+
+
+def _unpack_dict(view: memoryview, offset: int) -> tuple[dict, int]:
+    (length,) = _LENGTH.unpack_from(view, offset)
+    offset += _LENGTH.size
+    obj = {}
+    for _ in range(length):
+        key, offset = _unpack(view, offset)
+        obj[key], offset = _unpack(view, offset)
+    return obj, offset
+
+
+_UNPACKERS: dict[int, Callable[[memoryview, int], tuple[object, int]]] = {
+    ord("N"): lambda _, offset: (None, offset),
+    ord("T"): lambda _, offset: (True, offset),
+    ord("F"): lambda _, offset: (False, offset),
+    ord("i"): lambda view, offset: (_INT.unpack_from(view, offset)[0], offset + _INT.size),
+    ord("f"): lambda view, offset: (_FLOAT.unpack_from(view, offset)[0], offset + _FLOAT.size),
+    ord("I"): _unpack_big_int,
+    ord("s"): _unpack_str,
+    ord("b"): _unpack_bytes,
+    ord("l"): _unpack_list,
+    ord("d"): _unpack_dict,
+}
+
+
+def _unpack(view: memoryview, offset: int) -> tuple[object, int]:
+    tag = view[offset]
+    if (unpacker := _UNPACKERS.get(tag)) is None:
+        err_msg = f"Unknown tag: {tag:#x}"
+        raise ValueError(err_msg)
+    return unpacker(view, offset + 1)
+
+
+class BinaryCodec(Codec):
+    # Compact tagged format: bytes values are copied as they are instead of being base64
+    # encoded, and strings, bytes, lists and dicts are prefixed with their length.
+
+    def encode(self, msg: object) -> bytes:
+        out: list[Buffer] = [_MAGIC]
+        _pack(msg, out)
+        return b"".join(out)
+
+    def decode(self, data: Buffer) -> object:
+        view = memoryview(data).cast("B")
+        if view[:1] != _MAGIC:
+            err_msg = "Not a binary message"
+            raise ValueError(err_msg)
+        obj, offset = _unpack(view, len(_MAGIC))
+        if offset != len(view):
+            err_msg = "Trailing data after message"
+            raise ValueError(err_msg)
+        return obj
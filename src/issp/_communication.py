@@ -1,19 +1,70 @@
 from __future__ import annotations
 
-import base64
-import json
+import asyncio
+import queue
+import threading
 from abc import ABC, abstractmethod
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from math import ceil
+from time import perf_counter_ns as tick
 from typing import TYPE_CHECKING
 
 from . import _log as log
+from ._codec import Codec, JSONCodec
 
 if TYPE_CHECKING:
-    from collections.abc import Callable
+    from collections.abc import Callable, Iterable, Sequence
+
+    from ._encryption import EncryptionLayer
+    from ._util import Buffer
 
 type JSONMessage = dict[str, str | bytes]
 
 
+class Frame:
+    # A payload plus the headers and trailers added by each layer, kept as separate
+    # segments so that the payload is not copied every time a layer wraps it.
+
+    def __init__(self, payload: Buffer) -> None:
+        self._segments: deque[Buffer] = deque((payload,))
+
+    def __len__(self) -> int:
+        return sum(len(segment) for segment in self._segments)
+
+    def __bytes__(self) -> bytes:
+        if len(self._segments) == 1 and isinstance(self._segments[0], bytes):
+            return self._segments[0]
+        return b"".join(self._segments)
+
+    def prepend(self, header: Buffer) -> None:
+        self._segments.appendleft(header)
+
+    def append(self, trailer: Buffer) -> None:
+        self._segments.append(trailer)
+
+    @property
+    def segments(self) -> Sequence[Buffer]:
+        return self._segments
+
+    def flatten(self) -> Buffer:
+        if len(self._segments) > 1:
+            self._segments = deque((b"".join(self._segments),))
+        return self._segments[0]
+
+
+def view_to_bytes(view: memoryview | None) -> bytes | None:
+    if view is None:
+        return None
+    obj = view.obj
+    return obj if isinstance(obj, bytes) and len(obj) == view.nbytes else view.tobytes()
+
+
 class Layer(ABC):
+    # False for channels that keep delivering their last message, such as Channel.
+    consumes_messages = True
+
     @abstractmethod
     def send(self, msg: bytes) -> None:
         pass
@@ -22,6 +73,57 @@ class Layer(ABC):
     def receive(self) -> bytes | None:
         pass
 
+    def send_many(self, msgs: Iterable[bytes]) -> None:
+        for msg in msgs:
+            self.send(msg)
+
+    def receive_many(self, count: int) -> list[bytes]:
+        # Over a channel that does not consume messages, receive() never returns None,
+        # so at most one message is taken, as Channel.receive_many does.
+        if not self.bottom_layer().consumes_messages:
+            count = min(count, 1)
+        msgs = []
+        while len(msgs) < count and (msg := self.receive()) is not None:
+            msgs.append(msg)
+        return msgs
+
+    # Zero-copy counterparts of the above: layers that override them pass frames down
+    # and memoryview slices up, and only the physical layer materializes messages.
+
+    def send_frame(self, frame: Frame) -> None:
+        self.send(bytes(frame))
+
+    def send_frames(self, frames: Sequence[Frame]) -> None:
+        self.send_many(bytes(frame) for frame in frames)
+
+    def receive_view(self) -> memoryview | None:
+        msg = self.receive()
+        return None if msg is None else memoryview(msg)
+
+    def receive_views(self, count: int) -> list[memoryview]:
+        return [memoryview(msg) for msg in self.receive_many(count)]
+
+    # Async counterparts. By default they run their synchronous versions, so that only
+    # layers that actually wait on I/O need to override them.
+
+    async def asend(self, msg: bytes) -> None:
+        self.send(msg)
+
+    async def asend_many(self, msgs: Iterable[bytes]) -> None:
+        self.send_many(msgs)
+
+    async def asend_frames(self, frames: Sequence[Frame]) -> None:
+        self.send_frames(frames)
+
+    async def areceive(self) -> bytes | None:
+        return self.receive()
+
+    async def areceive_many(self, count: int) -> list[bytes]:
+        return self.receive_many(count)
+
+    async def areceive_views(self, count: int) -> list[memoryview]:
+        return self.receive_views(count)
+
     def __init__(self, layer: Layer | None = None) -> None:
         self.upper_layer: Layer | None = None
         self.lower_layer = layer
@@ -58,11 +160,71 @@ class Layer(ABC):
         return self if self.lower_layer is None else self.lower_layer.bottom_layer()
 
 
+class FramedLayer(Layer, ABC):
+    # Base for layers that work on frames in batches: subclasses only transform frames
+    # on their way down and views on their way up, and every send/receive variant,
+    # synchronous or not, is routed through those transformations.
+
+    @abstractmethod
+    def encode_frames(self, frames: Sequence[Frame]) -> Sequence[Frame]:
+        pass
+
+    @abstractmethod
+    def decode_views(self, views: list[memoryview]) -> list[memoryview]:
+        pass
+
+    def send_frames(self, frames: Sequence[Frame]) -> None:
+        self.lower_layer.send_frames(self.encode_frames(frames))
+
+    def receive_views(self, count: int) -> list[memoryview]:
+        return self.decode_views(self.lower_layer.receive_views(count))
+
+    async def asend_frames(self, frames: Sequence[Frame]) -> None:
+        await self.lower_layer.asend_frames(self.encode_frames(frames))
+
+    async def areceive_views(self, count: int) -> list[memoryview]:
+        return self.decode_views(await self.lower_layer.areceive_views(count))
+
+    def send(self, msg: bytes) -> None:
+        self.send_frames([Frame(msg)])
+
+    def send_many(self, msgs: Iterable[bytes]) -> None:
+        self.send_frames([Frame(msg) for msg in msgs])
+
+    def send_frame(self, frame: Frame) -> None:
+        self.send_frames([frame])
+
+    def receive(self) -> bytes | None:
+        return view_to_bytes(self.receive_view())
+
+    def receive_many(self, count: int) -> list[bytes]:
+        return [view_to_bytes(view) for view in self.receive_views(count)]
+
+    def receive_view(self) -> memoryview | None:
+        views = self.receive_views(1)
+        return views[0] if views else None
+
+    async def asend(self, msg: bytes) -> None:
+        await self.asend_frames([Frame(msg)])
+
+    async def asend_many(self, msgs: Iterable[bytes]) -> None:
+        await self.asend_frames([Frame(msg) for msg in msgs])
+
+    async def areceive(self) -> bytes | None:
+        views = await self.areceive_views(1)
+        return view_to_bytes(views[0]) if views else None
+
+    async def areceive_many(self, count: int) -> list[bytes]:
+        return [view_to_bytes(view) for view in await self.areceive_views(count)]
+
+
 class PhysicalLayer(Layer):
     pass
 
 
 class Channel(PhysicalLayer):
+    consumes_messages = False
+
     def __init__(self) -> None:
         super().__init__()
         self._msg: bytes | None = None
@@ -70,11 +232,110 @@ class Channel(PhysicalLayer):
     def send(self, msg: bytes) -> None:
         self._msg = msg
 
+    def send_frame(self, frame: Frame) -> None:
+        self._msg = bytes(frame)
+
     def receive(self) -> bytes | None:
         return self._msg
 
+    def receive_many(self, count: int) -> list[bytes]:
+        return [] if self._msg is None or count < 1 else [self._msg]
+
+
+class QueueChannel(PhysicalLayer):
+    # Thread-safe FIFO channel. If maxsize is positive, senders are throttled once it is
+    # full: they wait for room if the channel is blocking, otherwise queue.Full is raised.
+    # Receiving from an empty channel returns None, after waiting if it is blocking.
+
+    def __init__(
+        self,
+        maxsize: int = 0,
+        *,
+        block: bool = False,
+        timeout: float | None = None,
+    ) -> None:
+        super().__init__()
+        self._queue: queue.Queue[bytes] = queue.Queue(maxsize)
+        self.block = block
+        self.timeout = timeout
+
+    def __len__(self) -> int:
+        return self._queue.qsize()
+
+    def send(self, msg: bytes) -> None:
+        self._queue.put(msg, block=self.block, timeout=self.timeout)
+
+    def send_frame(self, frame: Frame) -> None:
+        self.send(bytes(frame))
+
+    def receive(self) -> bytes | None:
+        try:
+            return self._queue.get(block=self.block, timeout=self.timeout)
+        except queue.Empty:
+            return None
+
+    def receive_many(self, count: int) -> list[bytes]:
+        # Only wait for the first message, then drain whatever is already available.
+        if count < 1 or (msg := self.receive()) is None:
+            return []
+        msgs = [msg]
+        try:
+            while len(msgs) < count:
+                msgs.append(self._queue.get_nowait())
+        except queue.Empty:
+            pass
+        return msgs
+
 
-class AntiReplayLayer(Layer):
+class AsyncChannel(PhysicalLayer):
+    # FIFO channel for asyncio. Synchronous methods never wait: send raises
+    # asyncio.QueueFull if the channel is full, and receive returns None if it is empty.
+
+    def __init__(self, maxsize: int = 0) -> None:
+        super().__init__()
+        self._queue: asyncio.Queue[bytes] = asyncio.Queue(maxsize)
+
+    def __len__(self) -> int:
+        return self._queue.qsize()
+
+    def send(self, msg: bytes) -> None:
+        self._queue.put_nowait(msg)
+
+    def send_frame(self, frame: Frame) -> None:
+        self.send(bytes(frame))
+
+    def receive(self) -> bytes | None:
+        try:
+            return self._queue.get_nowait()
+        except asyncio.QueueEmpty:
+            return None
+
+    async def asend(self, msg: bytes) -> None:
+        await self._queue.put(msg)
+
+    async def asend_many(self, msgs: Iterable[bytes]) -> None:
+        for msg in msgs:
+            await self._queue.put(msg)
+
+    async def asend_frames(self, frames: Sequence[Frame]) -> None:
+        await self.asend_many(bytes(frame) for frame in frames)
+
+    async def areceive(self) -> bytes:
+        return await self._queue.get()
+
+    async def areceive_many(self, count: int) -> list[bytes]:
+        if count < 1:
+            return []
+        msgs = [await self._queue.get()]
+        while len(msgs) < count and (msg := self.receive()) is not None:
+            msgs.append(msg)
+        return msgs
+
+    async def areceive_views(self, count: int) -> list[memoryview]:
+        return [memoryview(msg) for msg in await self.areceive_many(count)]
+
+
+class AntiReplayLayer(FramedLayer):
     # Note: This is only secure if the underlying layers provide authentication.
 
     COUNTER_SIZE = 8
@@ -83,23 +344,25 @@ class AntiReplayLayer(Layer):
         super().__init__(layer)
         self._counter = 0
 
-    def send(self, msg: bytes) -> None:
-        self._counter += 1
-        self.lower_layer.send(msg + self._counter.to_bytes(self.COUNTER_SIZE))
+    def encode_frames(self, frames: Sequence[Frame]) -> Sequence[Frame]:
+        for frame in frames:
+            self._counter += 1
+            frame.append(self._counter.to_bytes(self.COUNTER_SIZE))
+        return frames
 
-    def receive(self) -> bytes | None:
-        if (msg := self.lower_layer.receive()) is None:
-            return None
-        if int.from_bytes(msg[-self.COUNTER_SIZE :]) < self._counter:
-            err_msg = "Replay attack detected"
-            raise ValueError(err_msg)
-        return msg[: -self.COUNTER_SIZE]
+    def decode_views(self, msgs: list[memoryview]) -> list[memoryview]:
+        for msg in msgs:
+            if int.from_bytes(msg[-self.COUNTER_SIZE :]) < self._counter:
+                err_msg = "Replay attack detected"
+                raise ValueError(err_msg)
+        return [msg[: -self.COUNTER_SIZE] for msg in msgs]
 
 
 class Actor:
-    def __init__(self, name: str, *, quiet: bool = False) -> None:
+    def __init__(self, name: str, *, quiet: bool = False, codec: Codec | None = None) -> None:
         self.name = name
         self.quiet = quiet
+        self.codec = JSONCodec() if codec is None else codec
 
     def __repr__(self) -> str:
         return f"{self.__class__.__name__}({self.name!r})"
@@ -109,11 +372,27 @@ class Actor:
 
     def send(self, layer: Layer, msg: bytes | object) -> None:
         try:
-            layer.send(_try_encode(msg))
+            layer.send(self.codec.try_encode(msg))
         except Exception as e:
             self._log("was unable to send: %s (%s)", msg, str(e))
         else:
-            self._log("sent: %s", _try_decode(msg))
+            self._log("sent: %s", log.lazy(self.codec.try_decode, msg))
+
+    def send_stream(
+        self,
+        layer: EncryptionLayer,
+        msg: bytes | object,
+        chunks: Iterable[bytes],
+    ) -> None:
+        # Sends msg, then chunks as a stream on the same layer, e.g. a write request
+        # without data followed by the file contents (see FileServer.handle_write_stream).
+        self.send(layer, msg)
+        try:
+            layer.send_stream(chunks)
+        except Exception as e:
+            self._log("was unable to send stream: %s", str(e))
+        else:
+            self._log("sent stream")
 
     def receive(self, layer: Layer, *, decode: bool = True) -> bytes | object | None:
         try:
@@ -121,37 +400,115 @@ class Actor:
         except Exception as e:
             self._log("was unable to receive: %s", str(e))
             return None
+        return self._received(msg, decode=decode)
+
+    async def asend(self, layer: Layer, msg: bytes | object) -> None:
+        try:
+            await layer.asend(self.codec.try_encode(msg))
+        except Exception as e:
+            self._log("was unable to send: %s (%s)", msg, str(e))
+        else:
+            self._log("sent: %s", log.lazy(self.codec.try_decode, msg))
+
+    async def areceive(self, layer: Layer, *, decode: bool = True) -> bytes | object | None:
+        try:
+            msg = await layer.areceive()
+        except Exception as e:
+            self._log("was unable to receive: %s", str(e))
+            return None
+        return self._received(msg, decode=decode)
+
+    def _received(self, msg: bytes | None, *, decode: bool) -> bytes | object | None:
         if decode:
-            msg = _try_decode(msg)
+            msg = self.codec.try_decode(msg)
         self._log("received: %s", msg)
         return msg
 
     def _log(self, fmt: str, *args: object) -> None:
-        if not self.quiet:
+        if not self.quiet and log.is_enabled(log.INFO):
             log.info("%s " + fmt, self.name, *args)
 
 
 class Server(Actor):
-    def __init__(self, name: str, *, quiet: bool = False) -> None:
-        super().__init__(name, quiet=quiet)
+    LATENCY_WINDOW = 100_000
+
+    def __init__(self, name: str, *, quiet: bool = False, codec: Codec | None = None) -> None:
+        super().__init__(name, quiet=quiet, codec=codec)
         self.handlers: dict[str, Callable[[JSONMessage], JSONMessage]] = {}
+        self.latencies: deque[int] = deque(maxlen=self.LATENCY_WINDOW)
 
     def handle_request(self, channel: Channel) -> JSONMessage:
+        start = tick()
+        response = self._respond(self.receive(channel))
+        self.send(channel, response)
+        self.latencies.append(tick() - start)
+        return response
+
+    def serve(self, channels: Iterable[Layer], workers: int | None = None) -> list[JSONMessage]:
+        # Handles one request per channel on a thread pool. Handlers spend most of their
+        # time in code that releases the GIL (e.g. scrypt), so threads do scale, and unlike
+        # processes they share the server state.
+        with ThreadPoolExecutor(workers) as pool:
+            return list(pool.map(self.handle_request, channels))
+
+    def latency_percentiles(
+        self,
+        percentiles: Iterable[float] = (50, 90, 99),
+    ) -> dict[float, int]:
+        # Nearest-rank percentiles of the recent request latencies, in nanoseconds.
+        if not (latencies := sorted(self.latencies)):
+            return {}
+        last = len(latencies) - 1
+        return {
+            p: latencies[min(max(ceil(len(latencies) * p / 100) - 1, 0), last)] for p in percentiles
+        }
+
+    async def ahandle_request(self, channel: Layer) -> JSONMessage:
+        # Timed from the arrival of the request, since waiting for it is not latency.
+        msg = await self.areceive(channel)
+        start = tick()
+        response = self._respond(msg)
+        await self.asend(channel, response)
+        self.latencies.append(tick() - start)
+        return response
+
+    def serve_channel(self, channel: Layer) -> int:
+        # Handles requests until the channel has nothing left to deliver, so the channel
+        # must consume messages (e.g. a queue or a socket, not a Channel).
+        count = 0
+        while (msg := channel.receive()) is not None:
+            start = tick()
+            self.send(channel, self._respond(self._received(msg, decode=True)))
+            self.latencies.append(tick() - start)
+            count += 1
+        return count
+
+    # Over a channel that consumes messages, the response is queued behind the request and
+    # the client reads it back, otherwise the next exchange would take it as its request.
+
+    def exchange(self, channel: Channel, client: Actor, msg: JSONMessage) -> JSONMessage:
+        client.send(channel, msg)
+        response = self.handle_request(channel)
+        if channel.bottom_layer().consumes_messages:
+            client.receive(channel)
+        return response
+
+    async def aexchange(self, channel: Layer, client: Actor, msg: JSONMessage) -> JSONMessage:
+        await client.asend(channel, msg)
+        response = await self.ahandle_request(channel)
+        if channel.bottom_layer().consumes_messages:
+            await client.areceive(channel)
+        return response
+
+    def _respond(self, msg: JSONMessage | None) -> JSONMessage:
         action = None
-        msg = self.receive(channel)
         try:
             action = msg["action"]
             response = self._handle_message(action, msg)
         except Exception as e:
             log.error("Error handling request: %s", str(e))
             response = {"status": "error"}
-        response = {"action": action} | response if action else response
-        self.send(channel, response)
-        return response
-
-    def exchange(self, channel: Channel, client: Actor, msg: JSONMessage) -> JSONMessage:
-        client.send(channel, msg)
-        return self.handle_request(channel)
+        return {"action": action} | response if action else response
 
     def _handle_message(self, action: str, msg: JSONMessage) -> JSONMessage:
         return self.handlers[action](msg)
@@ -166,11 +523,17 @@ class BankServer(Server, ABC):
     def authenticate(self, msg: JSONMessage) -> bool:
         pass
 
-    def __init__(self, name: str, *, quiet: bool = False) -> None:
-        super().__init__(name, quiet=quiet)
+    def __init__(self, name: str, *, quiet: bool = False, codec: Codec | None = None) -> None:
+        super().__init__(name, quiet=quiet, codec=codec)
         self.db: dict[str, dict] = {}
         self.handlers["register"] = self._register
         self.handlers["perform_transaction"] = self._perform_transaction
+        self._locks: dict[str, threading.Lock] = {}
+        self._locks_lock = threading.Lock()
+
+    def _account_lock(self, user: str) -> threading.Lock:
+        with self._locks_lock:
+            return self._locks.setdefault(user, threading.Lock())
 
     def _register(self, msg: JSONMessage) -> JSONMessage:
         return {"status": "success" if self.register(msg) else "failure"}
@@ -185,13 +548,20 @@ class BankServer(Server, ABC):
         recipient_record = self.db[recipient]
         amount = msg["amount"]
 
-        if user_record["balance"] < amount:
-            return {"status": "insufficient funds"}
+        # Locks are always taken in the same order, so that concurrent transfers
+        # between the same accounts cannot deadlock.
+        with ExitStack() as stack:
+            for account in sorted({user, recipient}):
+                stack.enter_context(self._account_lock(account))
 
-        user_record["balance"] -= amount
-        recipient_record["balance"] += amount
+            if user_record["balance"] < amount:
+                return {"status": "insufficient funds"}
 
-        log.info("Current balances: %s", {k: v["balance"] for k, v in self.db.items()})
+            user_record["balance"] -= amount
+            recipient_record["balance"] += amount
+
+        balances = {k: v["balance"] for k, v in dict(self.db).items()}
+        log.info("Current balances: %s", balances)
 
         return {"status": "success", "user": user, "recipient": recipient, "amount": amount}
 
@@ -201,8 +571,8 @@ class FileServer(Server, ABC):
     def authorize(self, user: str, file: str, action: str) -> bool:
         pass
 
-    def __init__(self, name: str, *, quiet: bool = False) -> None:
-        super().__init__(name, quiet=quiet)
+    def __init__(self, name: str, *, quiet: bool = False, codec: Codec | None = None) -> None:
+        super().__init__(name, quiet=quiet, codec=codec)
         self.file_data: dict[str, bytes] = {}
         self.handlers["read"] = self._read
         self.handlers["write"] = self._write
@@ -217,74 +587,35 @@ class FileServer(Server, ABC):
             return {"status": "file not found"}
         return {"status": "success", "data": data}
 
+    def handle_write_stream(self, layer: EncryptionLayer) -> JSONMessage:
+        # Handles a write request whose data follows it on the same layer as a stream, so
+        # that the file is stored as the chunks are decrypted rather than decoded from a
+        # single message. The channel must consume messages (e.g. a queue, not a Channel).
+        msg = self.receive(layer)
+        stream = layer.receive_stream()
+        if isinstance(msg, dict) and msg.get("action") == "write":
+            response = self._respond(msg | {"data": stream})
+        else:
+            response = {"status": "error"}
+        # The rest of a rejected stream is still read, so that the layer stays in sync.
+        deque(stream, maxlen=0)
+        self.send(layer, response)
+        return response
+
     def _write(self, msg: JSONMessage) -> JSONMessage:
         data = msg["data"]
         path = msg["path"]
+        overwrite = msg.get("overwrite", "false") == "true"
 
-        if not isinstance(data, bytes):
+        if isinstance(data, str):
             data = data.encode()
 
-        if msg.get("overwrite", "false") == "true":
-            self.file_data[path] = data
+        if isinstance(data, bytes):
+            self.file_data[path] = data if overwrite else self.file_data.get(path, b"") + data
         else:
-            self.file_data[path] = self.file_data.get(path, b"") + data
+            # Chunks from handle_write_stream, joined once.
+            chunks = [] if overwrite else [self.file_data.get(path, b"")]
+            chunks += data
+            self.file_data[path] = b"".join(chunks)
 
         return {"status": "success"}
-
-
-def _preprocess_bytes(obj: object) -> object:
-    if isinstance(obj, dict):
-        new_obj = {}
-        for key, value in obj.items():
-            if isinstance(value, bytes):
-                new_obj[f"{key}_b64"] = base64.b64encode(value).decode("ascii")
-            elif isinstance(value, dict | list):
-                new_obj[key] = _preprocess_bytes(value)
-            else:
-                new_obj[key] = value
-        return new_obj
-    if isinstance(obj, list):
-        return [_preprocess_bytes(item) for item in obj]
-    return obj
-
-
-def _postprocess_bytes(obj: object) -> object:
-    if isinstance(obj, dict):
-        new_obj = {}
-        for key, value in obj.items():
-            if key.endswith("_b64"):
-                new_obj[key[:-4]] = base64.b64decode(value)
-            elif isinstance(value, dict | list):
-                new_obj[key] = _postprocess_bytes(value)
-            else:
-                new_obj[key] = value
-        return new_obj
-    if isinstance(obj, list):
-        return [_postprocess_bytes(item) for item in obj]
-    return obj
-
-
-class BytesAwareJSONEncoder(json.JSONEncoder):
-    def encode(self, o: json.Any) -> str:
-        return super().encode(_preprocess_bytes(o))
-
-
-class BytesAwareJSONDecoder(json.JSONDecoder):
-    def decode(self, s: str) -> json.Any:
-        return _postprocess_bytes(super().decode(s))
-
-
-def _try_encode(msg: bytes | object) -> bytes:
-    if isinstance(msg, bytes):
-        return msg
-    try:
-        return json.dumps(msg, cls=BytesAwareJSONEncoder).encode()
-    except Exception:
-        return msg
-
-
-def _try_decode(msg: bytes | None) -> bytes | object | None:
-    try:
-        return None if msg is None else json.loads(msg, cls=BytesAwareJSONDecoder)
-    except Exception:
-        return msg
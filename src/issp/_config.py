@@ -4,3 +4,4 @@ PKG_DIR = Path(__file__).parent
 SRC_DIR = PKG_DIR.parent
 ROOT_DIR = SRC_DIR.parent
 RES_DIR = PKG_DIR / "res"
+CACHE_DIR = ROOT_DIR / ".cache"
@@ -0,0 +1,567 @@
+from __future__ import annotations
+
+import functools
+import itertools
+import math
+import mmap
+import os
+import string
+import struct
+import sys
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from multiprocessing import Event
+from time import perf_counter_ns as tick
+from typing import TYPE_CHECKING, Self
+
+from . import _log as log
+from ._config import CACHE_DIR
+from ._functions import scrypt, sha256
+from ._password import common_passwords
+from ._util import byte_size
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Iterable, Iterator, Mapping, Sequence
+    from multiprocessing.synchronize import Event as EventType
+    from pathlib import Path
+
+    from ._util import Buffer
+
+# Time a brute-force range should take on one worker, so that progress is reported often.
+_RANGE_SECONDS = 0.25
+# Size of the first brute-force ranges, before the throughput is known.
+_MIN_RANGE_SIZE = 2**6
+# Number of candidates a worker tries between checks of the shared stop event.
+_STOP_CHECK_INTERVAL = 2**10
+
+_stop_event: EventType | None = None
+
+# Upper bound on the candidate LCG moduli tried, from the smallest.
+_MAX_LCG_MODULI = 2**4
+# Primes below this are divided out of the GCD that recovers the LCG modulus.
+_LCG_FACTOR_BOUND = 2**10
+_MIN_LCG_VALUES = 4
+# Number of values parsed from LCG.generate output to recover the parameters.
+_LCG_OUTPUT_PREFIX = 6
+
+# Magic, fingerprint of the password list, fingerprint of the probe digest, digest size,
+# password width.
+_INDEX_HEADER = struct.Struct("<8s32s32sII")
+_INDEX_MAGIC = b"ISSPDIC2"
+# Hashed when opening an index, since distinct functions (lambdas, closures, __main__
+# functions sharing a name) can have the same id.
+_INDEX_PROBE = b"issp dictionary index probe"
+
+
+class _Throughput:
+    def __init__(self, desc: str) -> None:
+        self._desc = desc
+        self._start = tick()
+        self._last_report = self._start
+        self.count = 0
+
+    def rate(self) -> float:
+        return self.count / (max(tick() - self._start, 1) / 10**9)
+
+    def update(self, count: int) -> None:
+        self.count += count
+        if (now := tick()) - self._last_report > 10**9:
+            self._last_report = now
+            self._report(now, "")
+
+    def done(self) -> None:
+        self._report(tick(), " (done)")
+
+    def _report(self, now: int, suffix: str) -> None:
+        rate = self.count / (max(now - self._start, 1) / 10**9)
+        log.info("%s: %d tried, %.0f/s%s", self._desc, self.count, rate, suffix)
+
+
+def _init_worker(stop_event: EventType) -> None:
+    global _stop_event  # noqa: PLW0603
+    _stop_event = stop_event
+
+
+def _keyspace(
+    charset: str,
+    max_len: int,
+    range_size: Callable[[], float],
+) -> Iterator[tuple[str, int]]:
+    # Splits the keyspace into contiguous index ranges, in the same order as
+    # itertools.product. Each range is identified by a fixed prefix and the length
+    # of the suffix that varies within it, which is the largest one that starts at the
+    # current index and whose range does not exceed range_size() candidates.
+    base = len(charset)
+    for length in range(1, max_len + 1):
+        index = 0
+        while index < base**length:
+            size = range_size()
+            suffix_length = 0
+            while (
+                suffix_length < length
+                and base ** (suffix_length + 1) <= size
+                and index % base ** (suffix_length + 1) == 0
+            ):
+                suffix_length += 1
+            prefix = []
+            digits = index // base**suffix_length
+            for _ in range(length - suffix_length):
+                digits, digit = divmod(digits, base)
+                prefix.append(charset[digit])
+            yield "".join(reversed(prefix)), suffix_length
+            index += base**suffix_length
+
+
+def _crack_range(
+    target: bytes,
+    charset: str,
+    prefix: str,
+    suffix_length: int,
+    hash_function: Callable[[bytes], bytes],
+) -> tuple[str | None, int]:
+    tried = 0
+    for suffix in itertools.product(charset, repeat=suffix_length):
+        if tried % _STOP_CHECK_INTERVAL == 0 and _stop_event and _stop_event.is_set():
+            break
+        tried += 1
+        candidate = prefix + "".join(suffix)
+        if hash_function(candidate.encode()) == target:
+            if _stop_event:
+                _stop_event.set()
+            return candidate, tried
+    return None, tried
+
+
+def _collect(futures: Iterable[Future], throughput: _Throughput) -> str | None:
+    found = None
+    for future in futures:
+        password, tried = future.result()
+        throughput.update(tried)
+        found = found or password
+    return found
+
+
+def brute_force(
+    target: bytes,
+    charset: str = string.ascii_lowercase,
+    max_len: int = 8,
+    hash_function: Callable[[bytes], bytes] = sha256,
+    *,
+    workers: int | None = None,
+    chunk_size: int = 2**16,
+) -> str | None:
+    workers = workers or os.cpu_count() or 1
+    throughput = _Throughput("Brute-forcing")
+    found = None
+
+    def range_size() -> float:
+        # Ranges grow with the measured throughput, up to chunk_size candidates.
+        size = max(throughput.rate() / workers * _RANGE_SECONDS, _MIN_RANGE_SIZE)
+        return min(size, chunk_size)
+
+    ranges = _keyspace(charset, max_len, range_size)
+
+    if workers == 1:
+        for prefix, suffix_length in ranges:
+            found, tried = _crack_range(target, charset, prefix, suffix_length, hash_function)
+            throughput.update(tried)
+            if found:
+                break
+        throughput.done()
+        return found
+
+    stop_event = Event()
+    with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(stop_event,)) as pool:
+        pending: set[Future] = set()
+        for prefix, suffix_length in ranges:
+            args = (target, charset, prefix, suffix_length, hash_function)
+            pending.add(pool.submit(_crack_range, *args))
+            # Keep a bounded number of ranges in flight, so that candidates are streamed.
+            if len(pending) >= workers * 2:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                if found := _collect(done, throughput):
+                    break
+        if found:
+            stop_event.set()
+            for future in pending:
+                future.cancel()
+        remaining = (f for f in wait(pending).done if not f.cancelled())
+        found = _collect(remaining, throughput) or found
+    throughput.done()
+    return found
+
+
+def _function_id(func: Callable) -> str:
+    if isinstance(func, functools.partial):
+        args = [*map(repr, func.args), *(f"{k}={v!r}" for k, v in func.keywords.items())]
+        return f"{_function_id(func.func)}({', '.join(args)})"
+    return f"{func.__module__}.{func.__qualname__}"
+
+
+class DictionaryIndex:
+    # Sorted file of fixed-width (digest, zero-padded password) records, memory-mapped
+    # and binary-searched, so lookups never load the whole dictionary.
+
+    def __init__(
+        self,
+        hash_function: Callable[[bytes], bytes],
+        passwords: Sequence[str] | None = None,
+        *,
+        cache_dir: Path = CACHE_DIR,
+    ) -> None:
+        self._hash_function = hash_function
+        self._passwords = common_passwords() if passwords is None else passwords
+        self._fingerprint = sha256("\n".join(self._passwords))
+        self._probe = sha256(hash_function(_INDEX_PROBE))
+        key = sha256(f"{_function_id(hash_function)}\n{self._probe.hex()}").hex()[:16]
+        self.path = cache_dir / f"dict-{key}.bin"
+
+        if self._read_header()[:2] != (self._fingerprint, self._probe):
+            self._build()
+
+        with self.path.open("rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._digest_size, width = _INDEX_HEADER.unpack_from(self._mmap)[3:]
+        self._record_size = self._digest_size + width
+        records_size = len(self._mmap) - _INDEX_HEADER.size
+        self._count = records_size // self._record_size if self._record_size else 0
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __contains__(self, digest: bytes) -> bool:
+        return self.get(digest) is not None
+
+    def close(self) -> None:
+        self._mmap.close()
+
+    def get(self, digest: bytes) -> str | None:
+        lo, hi = 0, self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            offset = _INDEX_HEADER.size + mid * self._record_size
+            if self._mmap[offset : offset + self._digest_size] < digest:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo == self._count:
+            return None
+        offset = _INDEX_HEADER.size + lo * self._record_size
+        if self._mmap[offset : offset + self._digest_size] != digest:
+            return None
+        record = self._mmap[offset + self._digest_size : offset + self._record_size]
+        return record.rstrip(b"\0").decode()
+
+    def _read_header(self) -> tuple[bytes | None, bytes | None, int, int]:
+        try:
+            with self.path.open("rb") as f:
+                magic, *header = _INDEX_HEADER.unpack(f.read(_INDEX_HEADER.size))
+        except (OSError, struct.error):
+            return None, None, 0, 0
+        return tuple(header) if magic == _INDEX_MAGIC else (None, None, 0, 0)
+
+    def _read_entries(self) -> dict[str, bytes]:
+        # Digests of a previous build, so that only new passwords need to be hashed.
+        fingerprint, probe, digest_size, width = self._read_header()
+        if fingerprint is None or probe != self._probe or not digest_size:
+            return {}
+        entries = {}
+        record_size = digest_size + width
+        with self.path.open("rb") as f:
+            f.seek(_INDEX_HEADER.size)
+            while len(record := f.read(record_size)) == record_size:
+                entries[record[digest_size:].rstrip(b"\0").decode()] = record[:digest_size]
+        return entries
+
+    def _build(self) -> None:
+        known = self._read_entries()
+        passwords = list(dict.fromkeys(self._passwords))
+        if missing := [p for p in passwords if p not in known]:
+            for password in log.percent(missing, "Building dictionary index"):
+                known[password] = self._hash_function(password.encode())
+
+        records = sorted((known[p], p.encode()) for p in passwords)
+        digest_size = len(records[0][0]) if records else 0
+        width = max((len(p) for _, p in records), default=0)
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(".tmp")
+        with tmp_path.open("wb") as f:
+            header = (_INDEX_MAGIC, self._fingerprint, self._probe, digest_size, width)
+            f.write(_INDEX_HEADER.pack(*header))
+            for digest, password in records:
+                f.write(digest + password.ljust(width, b"\0"))
+        tmp_path.replace(self.path)
+
+
+def _crack_salted(
+    salt: bytes | None,
+    targets: frozenset[bytes],
+    candidates: Sequence[str],
+    hash_function: Callable[[bytes, bytes | None], bytes],
+) -> tuple[bytes | None, dict[bytes, str], int]:
+    found = {}
+    tried = 0
+    for candidate in candidates:
+        tried += 1
+        if (digest := hash_function(candidate.encode(), salt=salt)) in targets:
+            found[digest] = candidate
+            if len(found) == len(targets):
+                break
+    return salt, found, tried
+
+
+def _salted_tasks(
+    passwords: Sequence[str],
+    remaining: Mapping[bytes | None, set[bytes]],
+    hash_function: Callable[[bytes, bytes | None], bytes],
+    chunk_size: int,
+) -> Iterator[tuple]:
+    # Rank-major: each chunk of candidates goes to every salt with uncracked users, and
+    # remaining is read lazily, so salts cracked in the meantime are skipped.
+    for start in range(0, len(passwords), chunk_size):
+        candidates = passwords[start : start + chunk_size]
+        for salt, targets in remaining.items():
+            if targets:
+                yield salt, frozenset(targets), candidates, hash_function
+
+
+def _crack_salted_pool(
+    tasks: Iterable[tuple],
+    collect: Callable[[bytes | None, dict[bytes, str], int], None],
+    remaining: Mapping[bytes | None, set[bytes]],
+    workers: int,
+) -> None:
+    with ProcessPoolExecutor(workers) as pool:
+        pending: dict[Future, bytes | None] = {}
+        for task in tasks:
+            pending[pool.submit(_crack_salted, *task)] = task[0]
+            if len(pending) < workers * 2:
+                continue
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                del pending[future]
+                collect(*future.result())
+            # Drop queued work for salts whose users have all been cracked.
+            for future, salt in list(pending.items()):
+                if not remaining[salt] and future.cancel():
+                    del pending[future]
+        for future in wait(pending).done:
+            collect(*future.result())
+
+
+def salted_dictionary_attack(
+    db: Mapping[int, Mapping[str, bytes]],
+    hash_function: Callable[[bytes, bytes | None], bytes] = scrypt,
+    passwords: Sequence[str] | None = None,
+    *,
+    workers: int | None = None,
+    chunk_size: int = 64,
+) -> dict[int, str]:
+    # Users sharing a salt are attacked together, so each (salt, candidate) pair is hashed
+    # once. Candidates are assumed to be sorted by frequency, and work is scheduled
+    # rank-major: the most common passwords are tried against every salt first.
+    passwords = common_passwords() if passwords is None else passwords
+    workers = workers or os.cpu_count() or 1
+    throughput = _Throughput("Cracking salted passwords")
+
+    users: dict[bytes | None, dict[bytes, list[int]]] = {}
+    for user, data in db.items():
+        users.setdefault(data.get("salt"), {}).setdefault(data["password"], []).append(user)
+    remaining = {salt: set(digests) for salt, digests in users.items()}
+    cracked: dict[int, str] = {}
+
+    def collect(salt: bytes | None, found: dict[bytes, str], tried: int) -> None:
+        throughput.update(tried)
+        for digest, password in found.items():
+            if digest in remaining[salt]:
+                remaining[salt].discard(digest)
+                cracked.update(dict.fromkeys(users[salt][digest], password))
+
+    tasks = _salted_tasks(passwords, remaining, hash_function, chunk_size)
+    if workers == 1:
+        for task in tasks:
+            collect(*_crack_salted(*task))
+    else:
+        _crack_salted_pool(tasks, collect, remaining, workers)
+    throughput.done()
+    return cracked
+
+
+@functools.cache
+def _small_primes() -> list[int]:
+    sieve = bytearray([1]) * _LCG_FACTOR_BOUND
+    sieve[:2] = b"\0\0"
+    for i in range(2, math.isqrt(_LCG_FACTOR_BOUND) + 1):
+        if sieve[i]:
+            sieve[i * i :: i] = bytes(len(range(i * i, _LCG_FACTOR_BOUND, i)))
+    return [i for i, is_prime in enumerate(sieve) if is_prime]
+
+
+def _small_prime_factors(n: int) -> list[int]:
+    factors = []
+    for p in _small_primes():
+        while n % p == 0:
+            factors.append(p)
+            n //= p
+    return factors
+
+
+def _lcg_moduli(multiple: int, bound: int) -> list[int]:
+    # Divisors of multiple obtained by dividing out its small prime factors, that are
+    # still greater than every observed value.
+    moduli = {multiple}
+    for p in _small_prime_factors(multiple):
+        moduli |= {m // p for m in moduli if m % p == 0 and m // p > bound}
+    return sorted(moduli)[:_MAX_LCG_MODULI]
+
+
+def _lcg_multiplier(m: int, values: Sequence[int]) -> int | None:
+    # Consecutive differences satisfy t[i + 1] = a * t[i] (mod m), so g = gcd(t[0], m)
+    # divides every difference and a is only determined modulo m // g. Every such multiplier
+    # generates the same values from x[0] on, and the smallest one is returned.
+    t0, t1 = values[1] - values[0], values[2] - values[1]
+    g = math.gcd(t0, m)
+    if t1 % g:
+        return None
+    step = m // g
+    return (t1 // g) * pow(t0 // g, -1, step) % step if step > 1 else 0
+
+
+def _lcg_fit(m: int, values: Sequence[int]) -> tuple[int, int, int] | None:
+    if (a := _lcg_multiplier(m, values)) is None:
+        return None
+    c = (values[1] - a * values[0]) % m
+    if all((a * x + c) % m == y for x, y in itertools.pairwise(values)):
+        return a, c, m
+    return None
+
+
+def _lcg_int_parameters(values: Sequence[int]) -> tuple[int, int, int]:
+    # With t[i] = x[i + 1] - x[i], every t[i + 2] * t[i] - t[i + 1]^2 is a multiple of m,
+    # so their GCD is m times a factor that is usually small. The smallest modulus that
+    # explains the values is kept.
+    if len(values) < _MIN_LCG_VALUES:
+        err_msg = f"At least {_MIN_LCG_VALUES} values are required, got {len(values)}"
+        raise ValueError(err_msg)
+
+    diffs = [y - x for x, y in itertools.pairwise(values)]
+    multiple = 0
+    for t0, t1, t2 in zip(diffs, diffs[1:], diffs[2:], strict=False):
+        multiple = math.gcd(multiple, t2 * t0 - t1 * t1)
+
+    if multiple > max(values):
+        for m in _lcg_moduli(multiple, max(values)):
+            if fit := _lcg_fit(m, values):
+                return fit
+
+    err_msg = "The values do not match any LCG"
+    raise ValueError(err_msg)
+
+
+def _lcg_output_widths(count: int, value_size: int) -> Iterator[tuple[int, ...]]:
+    # Widths of the first count values, from the most to the least likely: all values
+    # full size, then one of them shorter, and so on.
+    for short in range(count + 1):
+        for positions in itertools.combinations(range(count), short):
+            for sizes in itertools.product(range(value_size - 1, 0, -1), repeat=short):
+                widths = [value_size] * count
+                for i, size in zip(positions, sizes, strict=True):
+                    widths[i] = size
+                yield tuple(widths)
+
+
+def _lcg_output_values(output: memoryview, widths: Sequence[int]) -> list[int] | None:
+    values = []
+    offset = 0
+    for width in widths:
+        value = int.from_bytes(output[offset : offset + width], sys.byteorder)
+        # Each value must have been written with exactly its minimal width.
+        if offset + width > len(output) or byte_size(value) != width:
+            return None
+        values.append(value)
+        offset += width
+    return values
+
+
+def _lcg_generates(output: memoryview, params: tuple[int, int, int], first: int) -> bool:
+    a, c, m = params
+    data = bytearray()
+    value = first
+    # Bounded, since zero values take no bytes.
+    for _ in range(len(output) + 1):
+        if len(data) >= len(output):
+            return data[: len(output)] == output
+        data += value.to_bytes(byte_size(value), sys.byteorder)
+        value = (a * value + c) % m
+    return False
+
+
+def _lcg_output_parameters(output: Buffer, value_size: int | None) -> tuple[int, int, int]:
+    # RNG.generate writes each value with its minimal width in native byte order, and
+    # truncates the last one. The first few values are parsed under the most likely
+    # widths until they give an LCG that reproduces the whole output.
+    if not value_size:
+        err_msg = "The value size is required to parse LCG output bytes"
+        raise ValueError(err_msg)
+    output = memoryview(output).cast("B")
+    count = min(_LCG_OUTPUT_PREFIX, len(output) // value_size)
+    if count < _MIN_LCG_VALUES:
+        err_msg = f"At least {_MIN_LCG_VALUES * value_size} bytes are required"
+        raise ValueError(err_msg)
+
+    for widths in _lcg_output_widths(count, value_size):
+        if (values := _lcg_output_values(output, widths)) is None:
+            continue
+        try:
+            params = _lcg_int_parameters(values)
+        except ValueError:
+            continue
+        if _lcg_generates(output, params, values[0]):
+            return params
+
+    err_msg = "The output does not match any LCG"
+    raise ValueError(err_msg)
+
+
+def lcg_parameters(
+    values: Sequence[int] | Buffer,
+    value_size: int | None = None,
+) -> tuple[int, int, int]:
+    # Recovers (a, c, m) from consecutive LCG outputs, given either as ints or as the
+    # bytes returned by LCG.generate, whose values are at most value_size bytes long.
+    # Outputs truncated to their high bits are not supported.
+    if isinstance(values, bytes | bytearray | memoryview):
+        return _lcg_output_parameters(values, value_size)
+    return _lcg_int_parameters(values)
+
+
+def _try_lcg_parameters(
+    values: Sequence[int] | Buffer,
+    value_size: int | None,
+) -> tuple[int, int, int] | None:
+    try:
+        return lcg_parameters(values, value_size)
+    except ValueError:
+        return None
+
+
+def lcg_parameters_many(
+    streams: Iterable[Sequence[int] | Buffer],
+    value_size: int | None = None,
+    *,
+    workers: int | None = None,
+    chunk_size: int = 256,
+) -> list[tuple[int, int, int] | None]:
+    # Batch version of lcg_parameters: streams that do not match an LCG yield None.
+    workers = workers or os.cpu_count() or 1
+    crack = functools.partial(_try_lcg_parameters, value_size=value_size)
+    if workers == 1:
+        return list(map(crack, streams))
+    with ProcessPoolExecutor(workers) as pool:
+        return list(pool.map(crack, streams, chunksize=chunk_size))
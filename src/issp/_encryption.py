@@ -2,40 +2,120 @@ from __future__ import annotations
 
 import os
 from abc import ABC, abstractmethod
+from typing import TYPE_CHECKING
 
 from cryptography.hazmat.primitives import ciphers, hashes, padding, serialization
 from cryptography.hazmat.primitives.asymmetric import padding as asymmetric_padding, rsa
 from cryptography.hazmat.primitives.ciphers import algorithms, modes
 
-from ._communication import Layer
+from ._communication import Frame, FramedLayer, Layer, view_to_bytes
 from ._util import xor
 
+if TYPE_CHECKING:
+    from collections.abc import Iterable, Iterator, Sequence
 
-class EncryptionLayer(Layer):
+
+class EncryptionLayer(FramedLayer):
     def __init__(self, layer: Layer | None = None, cipher: Cipher | None = None) -> None:
         super().__init__(layer)
         self._cipher = cipher
 
-    def send(self, message: bytes) -> None:
-        if self._cipher.iv_size:
-            iv = os.urandom(self._cipher.iv_size)
-            kwargs = {"iv": iv}
-        else:
-            iv = None
-            kwargs = {}
-        message = self._cipher.encrypt(message, **kwargs)
-        if iv:
-            message = iv + message
-        self.lower_layer.send(message)
-
-    def receive(self) -> bytes | None:
-        if (message := self.lower_layer.receive()) is None:
-            return None
-        kwargs = {}
-        if self._cipher.iv_size:
-            kwargs["iv"] = message[: self._cipher.iv_size]
-            message = message[self._cipher.iv_size :]
-        return self._cipher.decrypt(message, **kwargs)
+    def encode_frames(self, frames: Sequence[Frame]) -> Sequence[Frame]:
+        iv_size = self._cipher.iv_size
+        # A single syscall provides the IVs for the whole batch.
+        ivs = os.urandom(iv_size * len(frames)) if iv_size else b""
+        encrypted = []
+        for i, frame in enumerate(frames):
+            if iv_size:
+                iv = ivs[i * iv_size : (i + 1) * iv_size]
+                encrypted.append(Frame(self._cipher.encrypt(bytes(frame), iv=iv)))
+                encrypted[-1].prepend(iv)
+            else:
+                encrypted.append(Frame(self._cipher.encrypt(bytes(frame))))
+        return encrypted
+
+    def decode_views(self, views: list[memoryview]) -> list[memoryview]:
+        iv_size = self._cipher.iv_size
+        messages = []
+        for view in views:
+            # Cipher implementations are only guaranteed to accept bytes, so the view is
+            # split first and only the ciphertext is copied.
+            if iv_size:
+                iv = view[:iv_size].tobytes()
+                message = self._cipher.decrypt(view_to_bytes(view[iv_size:]), iv=iv)
+            else:
+                message = self._cipher.decrypt(view_to_bytes(view))
+            messages.append(memoryview(message))
+        return messages
+
+    # Streams are sent as a sequence of non-empty frames terminated by an empty one,
+    # so the lower layer must deliver each frame exactly once and in order. A Channel
+    # only holds its last message, so over one the whole stream is a single frame.
+
+    def send_stream(self, chunks: Iterable[bytes]) -> None:
+        iv = os.urandom(self._cipher.iv_size) if self._cipher.iv_size else None
+        encryptor = self._cipher.encryptor(iv)
+        header = iv or b""
+        if not self.bottom_layer().consumes_messages:
+            data = [header, *map(encryptor.update, chunks), encryptor.finalize()]
+            self.lower_layer.send(b"".join(data))
+            return
+        for chunk in chunks:
+            if data := encryptor.update(chunk):
+                self.lower_layer.send(header + data if header else data)
+                header = b""
+        if (data := encryptor.finalize()) or header:
+            self.lower_layer.send(header + data)
+        self.lower_layer.send(b"")
+
+    def receive_stream(self) -> Iterator[bytes]:
+        single = not self.bottom_layer().consumes_messages
+        decryptor = None
+        while True:
+            if (message := self.lower_layer.receive()) is None:
+                err_msg = "The stream ended before its terminator"
+                raise ValueError(err_msg)
+            if not (message or single):
+                break
+            if decryptor is None:
+                iv = None
+                if self._cipher.iv_size:
+                    iv = message[: self._cipher.iv_size]
+                    message = message[self._cipher.iv_size :]
+                decryptor = self._cipher.decryptor(iv)
+            if data := decryptor.update(message):
+                yield data
+            if single:
+                break
+        if decryptor and (data := decryptor.finalize()):
+            yield data
+
+
+class CipherContext:
+    def __init__(
+        self,
+        context: ciphers.CipherContext,
+        padding_context: padding.PaddingContext | None = None,
+        *,
+        decrypt: bool = False,
+    ) -> None:
+        self._context = context
+        self._padding = padding_context
+        self._decrypt = decrypt
+
+    def update(self, data: bytes) -> bytes:
+        if self._padding is None:
+            return self._context.update(data)
+        if self._decrypt:
+            return self._padding.update(self._context.update(data))
+        return self._context.update(self._padding.update(data))
+
+    def finalize(self) -> bytes:
+        if self._padding is None:
+            return self._context.finalize()
+        if self._decrypt:
+            return self._padding.update(self._context.finalize()) + self._padding.finalize()
+        return self._context.update(self._padding.finalize()) + self._context.finalize()
 
 
 class Cipher(ABC):
@@ -55,6 +135,16 @@ class Cipher(ABC):
     def decrypt(self, message: bytes, *, iv: bytes) -> bytes:
         pass
 
+    def encryptor(self, iv: bytes | None = None) -> CipherContext:
+        del iv  # Unused
+        err_msg = f"{self.__class__.__name__} does not support streaming encryption"
+        raise TypeError(err_msg)
+
+    def decryptor(self, iv: bytes | None = None) -> CipherContext:
+        del iv  # Unused
+        err_msg = f"{self.__class__.__name__} does not support streaming decryption"
+        raise TypeError(err_msg)
+
 
 class SymmetricCipher(Cipher, ABC):
     @property
@@ -65,10 +155,22 @@ class SymmetricCipher(Cipher, ABC):
     def key_size(self) -> int:
         return len(self.key)
 
+    @property
+    def key(self) -> bytes:
+        return self._key
+
+    @key.setter
+    def key(self, key: bytes) -> None:
+        self._key = key
+        self._on_key_changed()
+
     def __init__(self, key: bytes | None = None) -> None:
         super().__init__()
         self.key = key or os.urandom(self.default_key_size)
 
+    def _on_key_changed(self) -> None:
+        pass
+
 
 class BlockCipher(SymmetricCipher, ABC):
     @property
@@ -113,35 +215,75 @@ class AES(BlockCipher):
         super().__init__(key)
         self.apply_padding = True
 
-    def encrypt(self, message: bytes, iv: bytes | None = None) -> bytes:
+    def _on_key_changed(self) -> None:
+        # ECB contexts carry no state across whole blocks, so they can be kept alive
+        # and reused until the key changes.
+        self._algorithm = algorithms.AES(self.key)
+        ecb = ciphers.Cipher(self._algorithm, modes.ECB())  # noqa: S305
+        self._ecb_encryptor = ecb.encryptor()
+        self._ecb_decryptor = ecb.decryptor()
+
+    def _cipher(self, iv: bytes | None) -> ciphers.Cipher:
         mode = modes.CBC(iv) if iv else modes.ECB()  # noqa: S305
-        encryptor = ciphers.Cipher(algorithms.AES(self.key), mode).encryptor()
-        if self.apply_padding:
-            padder = self._pad.padder()
-            message = padder.update(message) + padder.finalize()
+        return ciphers.Cipher(self._algorithm, mode)
+
+    def _check_blocks(self, data: bytes) -> None:
+        if len(data) % self.block_size:
+            err_msg = f"Data ({len(data)} B) is not a multiple of the block size"
+            raise ValueError(err_msg)
+
+    def encrypt_block(self, block: bytes) -> bytes:
+        self._check_blocks(block)
+        return self._ecb_encryptor.update(block)
+
+    def decrypt_block(self, block: bytes) -> bytes:
+        self._check_blocks(block)
+        return self._ecb_decryptor.update(block)
+
+    def encryptor(self, iv: bytes | None = None) -> CipherContext:
+        padder = self._pad.padder() if self.apply_padding else None
+        return CipherContext(self._cipher(iv).encryptor(), padder)
+
+    def decryptor(self, iv: bytes | None = None) -> CipherContext:
+        unpadder = self._pad.unpadder() if self.apply_padding else None
+        return CipherContext(self._cipher(iv).decryptor(), unpadder, decrypt=True)
+
+    def keystream(self, nonce: bytes, size: int) -> bytes:
+        # CTR mode over a zero buffer: E(nonce) || E(nonce + 1) || ... truncated to size.
+        encryptor = ciphers.Cipher(self._algorithm, modes.CTR(nonce)).encryptor()
+        return encryptor.update(bytes(size))
+
+    def encrypt(self, message: bytes, iv: bytes | None = None) -> bytes:
+        if not (iv or self.apply_padding):
+            return self.encrypt_block(message)
+        encryptor = self.encryptor(iv)
         return encryptor.update(message) + encryptor.finalize()
 
     def decrypt(self, message: bytes, iv: bytes | None = None) -> bytes:
-        mode = modes.CBC(iv) if iv else modes.ECB()  # noqa: S305
-        decryptor = ciphers.Cipher(algorithms.AES(self.key), mode).decryptor()
-        message = decryptor.update(message) + decryptor.finalize()
-        if self.apply_padding:
-            unpadder = self._pad.unpadder()
-            message = unpadder.update(message) + unpadder.finalize()
-        return message
+        if not (iv or self.apply_padding):
+            return self.decrypt_block(message)
+        decryptor = self.decryptor(iv)
+        return decryptor.update(message) + decryptor.finalize()
 
 
 class ChaCha(SymmetricCipher):
     iv_size = 16
     default_key_size = 32
 
+    def _cipher(self, iv: bytes) -> ciphers.Cipher:
+        return ciphers.Cipher(algorithms.ChaCha20(self.key, iv), mode=None)
+
+    def encryptor(self, iv: bytes) -> CipherContext:
+        return CipherContext(self._cipher(iv).encryptor())
+
+    def decryptor(self, iv: bytes) -> CipherContext:
+        return CipherContext(self._cipher(iv).decryptor())
+
     def encrypt(self, message: bytes, iv: bytes) -> bytes:
-        cipher = ciphers.Cipher(algorithms.ChaCha20(self.key, iv), mode=None)
-        return cipher.encryptor().update(message)
+        return self._cipher(iv).encryptor().update(message)
 
     def decrypt(self, message: bytes, iv: bytes) -> bytes:
-        cipher = ciphers.Cipher(algorithms.ChaCha20(self.key, iv), mode=None)
-        return cipher.decryptor().update(message)
+        return self._cipher(iv).decryptor().update(message)
 
 
 class RSA(AsymmetricCipher):
@@ -1,11 +1,27 @@
+from functools import lru_cache
+
 from cryptography.hazmat.primitives import hashes, hmac
 from cryptography.hazmat.primitives.kdf.scrypt import Scrypt
 
+# Number of keyed HMAC contexts kept around for reuse.
+_HMAC_CACHE_SIZE = 1024
+
+
+@lru_cache(maxsize=_HMAC_CACHE_SIZE)
+def _keyed_hmac(key: bytes, algorithm: type[hashes.HashAlgorithm]) -> hmac.HMAC:
+    # Keying pads the key and hashes the first inner and outer blocks, so the keyed
+    # context is computed once per key and copied for each message.
+    return hmac.HMAC(key, algorithm())
+
 
-def _hmac(data: bytes | str, key: bytes, algorithm: hashes.HashAlgorithm) -> bytes:
+def _hmac_context(key: bytes, algorithm: type[hashes.HashAlgorithm]) -> hmac.HMAC:
+    return _keyed_hmac(bytes(key), algorithm).copy()
+
+
+def _hmac(data: bytes | str, key: bytes, algorithm: type[hashes.HashAlgorithm]) -> bytes:
     if isinstance(data, str):
         data = data.encode()
-    mac = hmac.HMAC(key, algorithm)
+    mac = _hmac_context(key, algorithm)
     mac.update(data)
     return mac.finalize()
 
@@ -27,11 +43,27 @@ def _scrypt(data: bytes | str, n: int = 2**14, salt: bytes | None = None) -> byt
 
 
 def hmac_sha1(data: bytes | str, key: bytes) -> bytes:
-    return _hmac(data, key, hashes.SHA1())  # noqa: S303
+    return _hmac(data, key, hashes.SHA1)
 
 
 def hmac_sha256(data: bytes | str, key: bytes) -> bytes:
-    return _hmac(data, key, hashes.SHA256())
+    return _hmac(data, key, hashes.SHA256)
+
+
+def hmac_sha1_context(key: bytes) -> hmac.HMAC:
+    return _hmac_context(key, hashes.SHA1)
+
+
+def hmac_sha256_context(key: bytes) -> hmac.HMAC:
+    return _hmac_context(key, hashes.SHA256)
+
+
+def sha1_context() -> hashes.Hash:
+    return hashes.Hash(hashes.SHA1())  # noqa: S303
+
+
+def sha256_context() -> hashes.Hash:
+    return hashes.Hash(hashes.SHA256())
 
 
 def sha1(data: bytes | str, salt: bytes | None = None) -> bytes:
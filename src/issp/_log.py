@@ -40,6 +40,24 @@ def with_level(log_level: int | str) -> Callable | None:
     return functools.partial(log, log_level) if _LOGGER.isEnabledFor(log_level) else None
 
 
+def is_enabled(log_level: int | str) -> bool:
+    return _LOGGER.isEnabledFor(log_level)
+
+
+class _Lazy:
+    def __init__(self, func: Callable, *args: object) -> None:
+        self._func = func
+        self._args = args
+
+    def __str__(self) -> str:
+        return str(self._func(*self._args))
+
+
+def lazy(func: Callable, *args: object) -> object:
+    # Log argument computed only if the record is actually formatted.
+    return _Lazy(func, *args)
+
+
 def log(level: int | str, msg: str, *args: object, **kwargs: object) -> None:
     if title := kwargs.pop("title", None):
         _LOGGER.log(level, "\n=====[ Start %s ]=====", title)
@@ -0,0 +1,227 @@
+from __future__ import annotations
+
+import contextlib
+import socket
+import struct
+import threading
+from typing import TYPE_CHECKING, Self
+
+from . import _log as log
+from ._communication import Frame, Layer, PhysicalLayer, Server, view_to_bytes
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Iterable, Iterator, Sequence
+
+    from ._util import Buffer
+
+type Address = str | tuple[str, int]
+
+_LENGTH = struct.Struct("!I")
+
+# Upper bound on the buffers passed to a single sendmsg call (IOV_MAX is usually 1024).
+_MAX_BUFFERS = 512
+# Default upper bound on received messages, so that a peer cannot make the receiver
+# allocate whatever length it sends.
+_MAX_MESSAGE_SIZE = 2**26
+
+
+def _create_socket(address: Address) -> socket.socket:
+    if isinstance(address, str):
+        return socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    return sock
+
+
+class SocketChannel(PhysicalLayer):
+    # Physical layer over a connected stream socket. Messages are framed with a 4-byte
+    # big endian length prefix, and frames are written with a single scatter write.
+    # Receiving a message longer than max_message_size raises and closes the channel.
+
+    def __init__(self, sock: socket.socket, max_message_size: int = _MAX_MESSAGE_SIZE) -> None:
+        super().__init__()
+        self.socket = sock
+        self.max_message_size = max_message_size
+        self.closed = False
+
+    def send(self, msg: bytes) -> None:
+        self._sendmsg([_LENGTH.pack(len(msg)), msg])
+
+    def send_many(self, msgs: Iterable[bytes]) -> None:
+        self._sendmsg([buffer for msg in msgs for buffer in (_LENGTH.pack(len(msg)), msg)])
+
+    def send_frame(self, frame: Frame) -> None:
+        self._sendmsg([_LENGTH.pack(len(frame)), *frame.segments])
+
+    def send_frames(self, frames: Sequence[Frame]) -> None:
+        buffers = []
+        for frame in frames:
+            buffers.append(_LENGTH.pack(len(frame)))
+            buffers.extend(frame.segments)
+        self._sendmsg(buffers)
+
+    def receive(self) -> bytes | None:
+        return view_to_bytes(self.receive_view())
+
+    def receive_view(self) -> memoryview | None:
+        if (header := self._receive_exactly(_LENGTH.size)) is None:
+            return None
+        if (size := _LENGTH.unpack(header)[0]) > self.max_message_size:
+            self.close()
+            err_msg = f"Message of {size} bytes exceeds the maximum of {self.max_message_size}"
+            raise ValueError(err_msg)
+        return self._receive_exactly(size)
+
+    def receive_many(self, count: int) -> list[bytes]:
+        return [view_to_bytes(view) for view in self.receive_views(count)]
+
+    def receive_views(self, count: int) -> list[memoryview]:
+        views = []
+        while len(views) < count and (view := self.receive_view()) is not None:
+            views.append(view)
+        return views
+
+    def close(self) -> None:
+        self.closed = True
+        self.socket.close()
+
+    def _sendmsg(self, buffers: list[Buffer]) -> None:
+        if not hasattr(self.socket, "sendmsg"):
+            self.socket.sendall(b"".join(buffers))
+            return
+        buffers = [memoryview(buffer).cast("B") for buffer in buffers]
+        # sendmsg may perform partial writes, so keep going from where it stopped.
+        start = 0
+        while start < len(buffers):
+            sent = self.socket.sendmsg(buffers[start : start + _MAX_BUFFERS])
+            while start < len(buffers) and sent >= len(buffers[start]):
+                sent -= len(buffers[start])
+                start += 1
+            if sent:
+                buffers[start] = buffers[start][sent:]
+
+    def _receive_exactly(self, size: int) -> memoryview | None:
+        view = memoryview(bytearray(size))
+        received = 0
+        while received < size:
+            if not (n := self.socket.recv_into(view[received:])):
+                self.closed = True
+                return None
+            received += n
+        return view
+
+
+class ConnectionPool:
+    # Thread-safe pool of client connections to a single address. Channels handed out
+    # by channel() go back to the pool when the block exits normally, and are closed if
+    # it raises, since the stream may have been left mid-message.
+
+    def __init__(
+        self,
+        address: Address,
+        size: int = 8,
+        max_message_size: int = _MAX_MESSAGE_SIZE,
+    ) -> None:
+        self.address = address
+        self.size = size
+        self.max_message_size = max_message_size
+        self._idle: list[socket.socket] = []
+        self._lock = threading.Lock()
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        self.close()
+
+    @contextlib.contextmanager
+    def channel(self) -> Iterator[SocketChannel]:
+        with self._lock:
+            sock = self._idle.pop() if self._idle else None
+        if sock is None:
+            sock = _create_socket(self.address)
+            try:
+                sock.connect(self.address)
+            except BaseException:
+                sock.close()
+                raise
+        channel = SocketChannel(sock, self.max_message_size)
+        try:
+            yield channel
+        except BaseException:
+            channel.close()
+            raise
+        if channel.closed:
+            return
+        with self._lock:
+            if len(self._idle) < self.size:
+                self._idle.append(sock)
+                return
+        channel.close()
+
+    def close(self) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for sock in idle:
+            sock.close()
+
+
+class SocketServer:
+    # Accepts connections on a TCP (host, port) or Unix socket path address, and serves
+    # each of them on its own thread through Server.serve_channel. If given, stack builds
+    # the per-connection layer stack on top of the socket channel.
+
+    def __init__(
+        self,
+        server: Server,
+        address: Address,
+        stack: Callable[[Layer], Layer] | None = None,
+        backlog: int = 128,
+        max_message_size: int = _MAX_MESSAGE_SIZE,
+    ) -> None:
+        self.server = server
+        self.max_message_size = max_message_size
+        self._stack = stack
+        self._socket = _create_socket(address)
+        try:
+            if isinstance(address, tuple):
+                self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            self._socket.bind(address)
+            self._socket.listen(backlog)
+        except BaseException:
+            self._socket.close()
+            raise
+        self.address: Address = self._socket.getsockname()
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        self.close()
+
+    def start(self) -> threading.Thread:
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return thread
+
+    def serve_forever(self) -> None:
+        while True:
+            try:
+                conn, _ = self._socket.accept()
+            except OSError:
+                # The listening socket has been closed.
+                return
+            threading.Thread(target=self._serve_connection, args=(conn,), daemon=True).start()
+
+    def close(self) -> None:
+        self._socket.close()
+
+    def _serve_connection(self, conn: socket.socket) -> None:
+        channel = SocketChannel(conn, self.max_message_size)
+        layer = self._stack(channel) if self._stack else channel
+        try:
+            self.server.serve_channel(layer)
+        except Exception as e:
+            log.error("Closing connection: %s", str(e))
+        finally:
+            channel.close()
@@ -1,16 +1,32 @@
+from __future__ import annotations
+
+import mmap
 import os
 import random
 import string
+import struct
 import time
 from abc import abstractmethod
-from collections.abc import Callable
+from array import array
+from collections.abc import Callable, Iterator, Mapping, Sequence
+from concurrent.futures import ProcessPoolExecutor
 from functools import cache
+from itertools import repeat
+from typing import TYPE_CHECKING
 
 from . import _log as log
 from ._config import RES_DIR
 from ._functions import hmac_sha1, scrypt
 from ._random import random_choice, random_int, random_string
 
+if TYPE_CHECKING:
+    from pathlib import Path
+
+# Magic, row count, password width, whether passwords have variable length, salt width,
+# whether salts have variable length.
+_DB_HEADER = struct.Struct("<8sQI?I?")
+_DB_MAGIC = b"ISSPPWD2"
+
 
 def _hotp(key: bytes, counter: int, digits: int = 6) -> int:
     mac = hmac_sha1(counter.to_bytes(8), key)
@@ -62,14 +78,187 @@ def common_passwords() -> list[str]:
         return f.read().splitlines()
 
 
+@cache
+def _common_password_index() -> tuple[dict[str, int], dict[int, list[tuple[str, int]]]]:
+    # Passwords bucketed by length, each paired with a bitmask of the characters it uses.
+    char_bits: dict[str, int] = {}
+    buckets: dict[int, list[tuple[str, int]]] = {}
+    for password in common_passwords():
+        mask = 0
+        for c in password:
+            mask |= 1 << char_bits.setdefault(c, len(char_bits))
+        buckets.setdefault(len(password), []).append((password, mask))
+    return char_bits, buckets
+
+
+@cache
+def _common_passwords_matching(length: int, charset: str) -> tuple[str, ...]:
+    char_bits, buckets = _common_password_index()
+    allowed = 0
+    for c in charset:
+        if (bit := char_bits.get(c)) is not None:
+            allowed |= 1 << bit
+    return tuple(p for p, mask in buckets.get(length, ()) if not mask & ~allowed)
+
+
 def random_common_password(length: int = 5, charset: str = string.ascii_lowercase) -> str:
-    pwds = [p for p in common_passwords() if len(p) == length and all(c in charset for c in p)]
+    pwds = _common_passwords_matching(length, charset)
     if not pwds:
         err_msg = "No suitable password found"
         raise ValueError(err_msg)
     return random_choice(pwds)
 
 
+class _Column:
+    # Fixed-width values stored back to back. Shorter values are zero-padded, and their
+    # actual lengths are kept in a separate array.
+
+    def __init__(
+        self,
+        data: bytes | memoryview,
+        width: int,
+        lengths: Sequence[int] | None = None,
+    ) -> None:
+        self.data = data
+        self.width = width
+        self.lengths = lengths
+
+    @classmethod
+    def from_values(cls, values: Sequence[bytes]) -> _Column:
+        width = max(map(len, values), default=0)
+        lengths = array("I", map(len, values))
+        data = bytearray(width * len(values))
+        view = memoryview(data)
+        for i, value in enumerate(values):
+            view[i * width : i * width + len(value)] = value
+        return cls(data, width, None if all(n == width for n in lengths) else lengths)
+
+    def __getitem__(self, index: int) -> bytes:
+        start = index * self.width
+        end = start + (self.width if self.lengths is None else self.lengths[index])
+        return bytes(self.data[start:end])
+
+
+class PasswordDatabase(Mapping[int, dict[str, bytes]]):
+    def __init__(self, size: int, passwords: _Column, salts: _Column | None = None) -> None:
+        self._size = size
+        self._passwords = passwords
+        self._salts = salts
+        self._mmap: mmap.mmap | None = None
+
+    @classmethod
+    def from_values(
+        cls,
+        passwords: Sequence[bytes],
+        salts: Sequence[bytes] | None = None,
+    ) -> PasswordDatabase:
+        salt_column = _Column.from_values(salts) if salts else None
+        return cls(len(passwords), _Column.from_values(passwords), salt_column)
+
+    @classmethod
+    def from_dict(cls, db: Mapping[int, Mapping[str, bytes]]) -> PasswordDatabase:
+        rows = [db[i] for i in range(len(db))]
+        salts = [row["salt"] for row in rows] if rows and "salt" in rows[0] else None
+        return cls.from_values([row["password"] for row in rows], salts)
+
+    @classmethod
+    def load(cls, path: Path) -> PasswordDatabase:
+        with path.open("rb") as f:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, size, width, variable, salt_width, salt_variable = _DB_HEADER.unpack_from(buffer)
+        if magic != _DB_MAGIC:
+            buffer.close()
+            err_msg = f"Not a password database: {path}"
+            raise ValueError(err_msg)
+
+        view = memoryview(buffer)
+        offset = _DB_HEADER.size
+        data = view[offset : (offset := offset + size * width)]
+        lengths = None
+        if variable:
+            lengths = view[offset : (offset := offset + size * 4)].cast("I")
+        salts = None
+        if salt_width:
+            salt_data = view[offset : (offset := offset + size * salt_width)]
+            salt_lengths = None
+            if salt_variable:
+                salt_lengths = view[offset : offset + size * 4].cast("I")
+            salts = _Column(salt_data, salt_width, salt_lengths)
+
+        db = cls(size, _Column(data, width, lengths), salts)
+        db._mmap = buffer
+        return db
+
+    def save(self, path: Path) -> None:
+        passwords, salts = self._passwords, self._salts
+        header = _DB_HEADER.pack(
+            _DB_MAGIC,
+            self._size,
+            passwords.width,
+            passwords.lengths is not None,
+            salts.width if salts else 0,
+            salts is not None and salts.lengths is not None,
+        )
+        with path.open("wb") as f:
+            f.write(header)
+            f.write(passwords.data)
+            if passwords.lengths is not None:
+                f.write(array("I", passwords.lengths))
+            if salts:
+                f.write(salts.data)
+                if salts.lengths is not None:
+                    f.write(array("I", salts.lengths))
+
+    def close(self) -> None:
+        if self._mmap is not None:
+            # Views into the map must be released before it can be closed.
+            self._passwords = _Column(b"", 0)
+            self._salts = None
+            self._size = 0
+            self._mmap.close()
+            self._mmap = None
+
+    def __getitem__(self, index: int) -> dict[str, bytes]:
+        if not isinstance(index, int) or not 0 <= index < self._size:
+            raise KeyError(index)
+        row = {"password": self._passwords[index]}
+        if self._salts:
+            row["salt"] = self._salts[index]
+        return row
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(range(self._size))
+
+    def __len__(self) -> int:
+        return self._size
+
+
+def _hash_password(
+    hash_function: Callable[[bytes, bytes | None], bytes],
+    password: bytes,
+    salt: bytes | None,
+) -> bytes:
+    return hash_function(password, salt=salt)
+
+
+def _hash_passwords(
+    hash_function: Callable[[bytes, bytes | None], bytes],
+    passwords: list[bytes],
+    salts: list[bytes | None],
+    workers: int,
+) -> list[bytes]:
+    # Results are collected in order, so the output does not depend on the number of workers.
+    progress = log.percent(passwords, "Generating password database")
+    if workers == 1:
+        pairs = zip(progress, salts, strict=True)
+        return [hash_function(password, salt=salt) for password, salt in pairs]
+    with ProcessPoolExecutor(workers) as pool:
+        chunksize = max(1, len(passwords) // (workers * 16))
+        args = (_hash_password, repeat(hash_function), passwords, salts)
+        digests = pool.map(*args, chunksize=chunksize)
+        return [digest for _, digest in zip(progress, digests, strict=True)]
+
+
 def generate_password_database(
     length: int,
     random_ratio: float = 0.5,
@@ -77,7 +266,10 @@ def generate_password_database(
     random_max_length: int = 16,
     hash_function: Callable[[bytes, bytes | None], bytes] | None = scrypt,
     salt_length: int = 16,
-) -> dict[int, dict[str, bytes]]:
+    workers: int | None = 1,
+    *,
+    columnar: bool = False,
+) -> dict[int, dict[str, bytes]] | PasswordDatabase:
     common = common_passwords()
     repeat_common = length // len(common) + 1
     random_count = int(length * random_ratio)
@@ -90,18 +282,20 @@ def generate_password_database(
     ]
     passwords.extend(random.sample(common, counts=[repeat_common] * len(common), k=common_count))
     random.shuffle(passwords)
-
-    pass_dict: dict[int, dict[str, bytes]] = {
-        i: {"password": password.encode()} for i, password in enumerate(passwords)
-    }
+    passwords = [password.encode() for password in passwords]
+    salts = None
 
     if hash_function is not None:
-        for data in log.percent(pass_dict.values(), "Generating password database"):
-            if salt_length > 0:
-                salt = os.urandom(16)
-                data["salt"] = salt
-            else:
-                salt = None
-            data["password"] = hash_function(data["password"], salt=salt)
-
-    return pass_dict
+        salts = [os.urandom(16) for _ in passwords] if salt_length > 0 else None
+        workers = workers or os.cpu_count() or 1
+        passwords = _hash_passwords(hash_function, passwords, salts or [None] * length, workers)
+
+    if columnar:
+        return PasswordDatabase.from_values(passwords, salts)
+
+    if salts is None:
+        return {i: {"password": password} for i, password in enumerate(passwords)}
+    return {
+        i: {"password": password, "salt": salt}
+        for i, (password, salt) in enumerate(zip(passwords, salts, strict=True))
+    }
@@ -1,14 +1,25 @@
+from __future__ import annotations
+
+import itertools
 import os
 import secrets
 import string
 import sys
+import threading
 import time
 from abc import ABC, abstractmethod
-from collections.abc import Sequence
+from array import array
+from typing import TYPE_CHECKING, Self
 
 from ._authentication import SHA256
 from ._encryption import AES, BlockCipher
-from ._util import byte_size, xor
+from ._functions import sha256_context
+from ._util import xor
+
+if TYPE_CHECKING:
+    from collections.abc import Sequence
+
+    from ._util import Buffer
 
 
 class RNG[T: (int, bytes)](ABC):
@@ -21,19 +32,33 @@ class RNG[T: (int, bytes)](ABC):
         pass
 
     def _gen_int(self, first: int, size: int) -> bytes:
-        array = bytearray(first.to_bytes(byte_size(first), sys.byteorder))
-
-        while len(array) < size:
+        # Values are written straight into the output, each as its minimal little or big
+        # endian (native) representation, and the last one is truncated.
+        output = bytearray(size)
+        view = memoryview(output)
+        offset = 0
+        val = first
+        while True:
+            data = val.to_bytes((val.bit_length() + 7) // 8, sys.byteorder)
+            if (end := offset + len(data)) >= size:
+                view[offset:] = data[: size - offset]
+                return bytes(output)
+            view[offset:end] = data
+            offset = end
             val = self.next_value()
-            array.extend(val.to_bytes(byte_size(val), sys.byteorder))
-
-        return bytes(array[:size])
 
     def _gen_bytes(self, first: bytes, size: int) -> bytes:
-        array = bytearray(first)
-        while len(array) < size:
-            array.extend(self.next_value())
-        return bytes(array[:size])
+        output = bytearray(size)
+        view = memoryview(output)
+        offset = 0
+        val = first
+        while True:
+            if (end := offset + len(val)) >= size:
+                view[offset:] = val[: size - offset]
+                return bytes(output)
+            view[offset:end] = val
+            offset = end
+            val = self.next_value()
 
     def generate(self, size: int) -> bytes:
         val = self.next_value()
@@ -54,6 +79,34 @@ class LCG(RNG[int]):
     def set_seed(self, seed: int) -> None:
         self._state = seed % self._m
 
+    def skip(self, steps: int) -> None:
+        # Advances by composing the affine step x -> a * x + c with itself by repeated
+        # squaring, so jumping ahead takes O(log steps) multiplications.
+        if steps < 0:
+            err_msg = f"Cannot skip a negative number of steps ({steps})"
+            raise ValueError(err_msg)
+        a, c = 1, 0
+        step_a, step_c = self._a, self._c
+        while steps:
+            if steps & 1:
+                a, c = step_a * a % self._m, (step_a * c + step_c) % self._m
+            step_a, step_c = step_a * step_a % self._m, (step_a * step_c + step_c) % self._m
+            steps >>= 1
+        self._state = (a * self._state + c) % self._m
+
+    def next_values(self, count: int) -> array[int]:
+        if self._m > 2**64:
+            err_msg = f"Values modulo {self._m} do not fit in 64 bits"
+            raise ValueError(err_msg)
+        a, c, m, state = self._a, self._c, self._m, self._state
+        values = []
+        append = values.append
+        for _ in itertools.repeat(None, count):
+            state = (a * state + c) % m
+            append(state)
+        self._state = state
+        return array("Q", values)
+
 
 class CounterRNG(RNG[bytes]):
     def __init__(self, cipher: BlockCipher = None) -> None:
@@ -70,6 +123,15 @@ class CounterRNG(RNG[bytes]):
     def set_seed(self, seed: bytes) -> None:
         self._cipher.key = seed
 
+    def generate(self, size: int) -> bytes:
+        # The keystream matches next_value only for an unpadded AES block.
+        if not isinstance(self._cipher, AES) or self._cipher.apply_padding:
+            return super().generate(size)
+        block_size = self._cipher.block_size
+        nonce = (self._counter + 1).to_bytes(block_size)
+        self._counter += max(1, -(-size // block_size))
+        return self._cipher.keystream(nonce, size)
+
 
 class ANSIx917(RNG[bytes]):
     def __init__(self, cipher: BlockCipher = None) -> None:
@@ -96,27 +158,53 @@ class EntropySource:
     def get_entropy(self) -> bytes:
         return os.urandom(self._entropy_bytes)
 
+    def get_entropy_batch(self, count: int) -> list[memoryview]:
+        # One read for the whole batch, split into count samples.
+        size = self._entropy_bytes
+        entropy = memoryview(os.urandom(size * count))
+        return [entropy[i : i + size] for i in range(0, len(entropy), size)]
+
 
 class EntropyPool:
+    # Entropy is hashed as it arrives, so only its running digest and length are kept.
+
     def __init__(self, initial_entropy_bytes: int = 8) -> None:
-        initial_entropy = os.urandom(initial_entropy_bytes) if initial_entropy_bytes else b""
-        self._deskewer = SHA256()
-        self._pool = bytearray(initial_entropy)
+        self._deskewer = sha256_context()
+        self._size = 0
+        self._lock = threading.Lock()
+        if initial_entropy_bytes:
+            self.add_entropy(os.urandom(initial_entropy_bytes))
 
     def __len__(self) -> int:
-        return len(self._pool)
+        return self._size
 
-    def add_entropy(self, entropy: bytes) -> None:
-        self._pool.extend(entropy)
+    def add_entropy(self, entropy: Buffer) -> None:
+        with self._lock:
+            self._deskewer.update(entropy)
+            self._size += len(entropy)
 
     def get_entropy(self) -> bytes:
-        entropy = self._deskewer.compute_code(self._pool)
-        self._pool.clear()
+        with self._lock:
+            entropy = self._deskewer.finalize()
+            self._deskewer = sha256_context()
+            self._size = 0
         return entropy
 
 
 class Fortuna(RNG[bytes]):
-    def __init__(self, sources: int = 5, pools: int = 5, reseed_length: int = 120) -> None:
+    # If accumulate_interval is given, entropy is gathered by a background thread every
+    # accumulate_interval seconds instead of on each request, until close() is called.
+    # Pools have their own locks, and the generator state is guarded by another one, so
+    # instances can be shared across threads.
+
+    def __init__(
+        self,
+        sources: int = 5,
+        pools: int = 5,
+        reseed_length: int = 120,
+        *,
+        accumulate_interval: float | None = None,
+    ) -> None:
         self._sources = [EntropySource(2**i) for i in range(sources)]
         self._pools = [EntropyPool() for _ in range(pools)]
         self._cipher = AES()
@@ -125,11 +213,42 @@ class Fortuna(RNG[bytes]):
         self._reseed_length = reseed_length
         self._reseed_count = 0
         self._count = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._accumulator: threading.Thread | None = None
+        if accumulate_interval is not None:
+            if accumulate_interval <= 0:
+                err_msg = f"The accumulate interval must be positive, got {accumulate_interval}"
+                raise ValueError(err_msg)
+            self._accumulator = threading.Thread(
+                target=self._accumulate_forever,
+                args=(accumulate_interval,),
+                daemon=True,
+            )
+            self._accumulator.start()
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        self.close()
+
+    def close(self) -> None:
+        if self._accumulator is None:
+            return
+        self._stop.set()
+        self._accumulator.join()
+        self._accumulator = None
 
     def _accumulate_entropy(self) -> None:
-        for source in self._sources:
-            for pool in self._pools:
-                pool.add_entropy(source.get_entropy())
+        # Each pool receives one sample from every source, hashed with a single update.
+        batches = [source.get_entropy_batch(len(self._pools)) for source in self._sources]
+        for pool, samples in zip(self._pools, zip(*batches, strict=True), strict=True):
+            pool.add_entropy(b"".join(samples))
+
+    def _accumulate_forever(self, interval: float) -> None:
+        while not self._stop.wait(interval):
+            self._accumulate_entropy()
 
     def _get_entropy(self) -> bytes:
         entropy = bytearray()
@@ -142,19 +261,35 @@ class Fortuna(RNG[bytes]):
         self._reseed_count += 1
         entropy = self._get_entropy()
         key = self._hash.compute_code(self._cipher.key + self._hash.compute_code(entropy))
-        self.set_seed(key)
+        self._cipher.key = key
+
+    def _prepare(self) -> None:
+        # Must be called with the lock held.
+        if len(self._pools[0]) >= self._reseed_length:
+            self._reseed()
 
     def set_seed(self, seed: bytes) -> None:
-        self._cipher.key = seed
+        with self._lock:
+            self._cipher.key = seed
 
     def next_value(self) -> bytes:
-        self._accumulate_entropy()
+        if self._accumulator is None:
+            self._accumulate_entropy()
+        with self._lock:
+            self._prepare()
+            self._count += 1
+            return self._cipher.encrypt(self._count.to_bytes(self._cipher.block_size))
 
-        if len(self._pools[0]) >= self._reseed_length:
-            self._reseed()
-
-        self._count += 1
-        return self._cipher.encrypt(self._count.to_bytes(self._cipher.block_size))
+    def generate(self, size: int) -> bytes:
+        # A single accumulation round, then the counter blocks are encrypted in one CTR pass.
+        if self._accumulator is None:
+            self._accumulate_entropy()
+        with self._lock:
+            self._prepare()
+            block_size = self._cipher.block_size
+            nonce = (self._count + 1).to_bytes(block_size)
+            self._count += max(1, -(-size // block_size))
+            return self._cipher.keystream(nonce, size)
 
 
 class TRNG(RNG[bytes]):
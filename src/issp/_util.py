@@ -1,17 +1,37 @@
-def xor(a: bytes, b: bytes, *, add_zero_padding: bool = False) -> bytes:
-    a_size, b_size = len(a), len(b)
-    if a_size > b_size:
-        if add_zero_padding:
-            b = zero_pad(b, a_size)
-        else:
-            err_msg = f"RHS ({b_size} B) is too short for LHS ({a_size} B)"
-            raise ValueError(err_msg)
-    return bytes(a[i] ^ b[i] for i in range(a_size))
-
-
-def zero_pad(data: bytes, size: int) -> bytes:
+type Buffer = bytes | bytearray | memoryview
+
+
+def _check_xor_sizes(a_size: int, b_size: int, *, add_zero_padding: bool) -> None:
+    if a_size > b_size and not add_zero_padding:
+        err_msg = f"RHS ({b_size} B) is too short for LHS ({a_size} B)"
+        raise ValueError(err_msg)
+
+
+def _xor_int(a: Buffer, b: Buffer, size: int) -> int:
+    # Little endian, so that a short RHS behaves as if it had been zero-padded on the right.
+    return int.from_bytes(a, "little") ^ int.from_bytes(memoryview(b)[:size], "little")
+
+
+def xor(a: Buffer, b: Buffer, *, add_zero_padding: bool = False) -> bytes:
+    a_size = len(a)
+    _check_xor_sizes(a_size, len(b), add_zero_padding=add_zero_padding)
+    return _xor_int(a, b, a_size).to_bytes(a_size, "little")
+
+
+def xor_into(
+    target: bytearray | memoryview,
+    data: Buffer,
+    *,
+    add_zero_padding: bool = False,
+) -> None:
+    size = len(target)
+    _check_xor_sizes(size, len(data), add_zero_padding=add_zero_padding)
+    target[:] = _xor_int(target, data, size).to_bytes(size, "little")
+
+
+def zero_pad(data: Buffer, size: int) -> bytes:
     padding = size - len(data) % size
-    return data + bytes(padding) if padding else data
+    return b"".join((data, bytes(padding))) if padding else data
 
 
 def byte_size(number: int) -> int:
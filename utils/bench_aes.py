@@ -0,0 +1,46 @@
+# Microbenchmark comparing single-block AES encryption through a fresh cipher context
+# per call (the previous behavior of AES.encrypt) against the cached ECB context.
+#
+# Usage: python utils/bench_aes.py [blocks]
+
+import os
+import sys
+from collections.abc import Callable
+from time import perf_counter_ns as tick
+
+from cryptography.hazmat.primitives import ciphers
+from cryptography.hazmat.primitives.ciphers import algorithms, modes
+
+from issp import AES, log
+
+
+def encrypt_uncached(key: bytes, block: bytes) -> bytes:
+    encryptor = ciphers.Cipher(algorithms.AES(key), modes.ECB()).encryptor()  # noqa: S305
+    return encryptor.update(block) + encryptor.finalize()
+
+
+def bench(desc: str, blocks: list[bytes], func: Callable[[bytes], bytes]) -> int:
+    start = tick()
+    for block in blocks:
+        func(block)
+    elapsed = tick() - start
+    log.info("%s: %.2f s (%.0f ns/block)", desc, elapsed / 10**9, elapsed / len(blocks))
+    return elapsed
+
+
+def main() -> None:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10**6
+    cipher = AES()
+    cipher.apply_padding = False
+    blocks = [i.to_bytes(cipher.block_size) for i in range(count)]
+    key = os.urandom(cipher.default_key_size)
+    cipher.key = key
+
+    before = bench("Fresh context per block", blocks, lambda b: encrypt_uncached(key, b))
+    after = bench("AES.encrypt", blocks, cipher.encrypt)
+    bench("AES.encrypt_block", blocks, cipher.encrypt_block)
+    log.info("Speedup (AES.encrypt): %.1fx", before / after)
+
+
+if __name__ == "__main__":
+    main()
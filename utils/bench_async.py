@@ -0,0 +1,51 @@
+# Benchmark driving a BankServer through sequential Server.aexchange calls on a single
+# AsyncChannel. Each response is checked against its own request, so a response left
+# queued on the channel (and taken as the next request) fails the run.
+#
+# Usage: python utils/bench_async.py [exchanges]
+
+import asyncio
+import sys
+from time import perf_counter_ns as tick
+
+from issp import Actor, AsyncChannel, BankServer, JSONMessage, log
+
+
+class Server(BankServer):
+    def register(self, msg: JSONMessage) -> bool:
+        if msg["user"] in self.db:
+            return False
+        self.db[msg["user"]] = {"balance": 0}
+        return True
+
+    def authenticate(self, msg: JSONMessage) -> bool:
+        return msg["user"] in self.db
+
+
+async def run(count: int) -> None:
+    channel = AsyncChannel()
+    server = Server("Bank", quiet=True)
+    client = Actor("Client", quiet=True)
+
+    start = tick()
+    for i in range(count):
+        response = await server.aexchange(channel, client, {"action": "register", "user": f"u{i}"})
+        if response != {"action": "register", "status": "success"}:
+            err_msg = f"Exchange {i} got {response}"
+            raise RuntimeError(err_msg)
+    elapsed = tick() - start
+
+    if len(channel):
+        err_msg = f"{len(channel)} messages left on the channel"
+        raise RuntimeError(err_msg)
+    log.info("aexchange: %.0f μs/exchange", elapsed / count / 10**3)
+    log.info("Latency percentiles (ns): %s", server.latency_percentiles())
+
+
+def main() -> None:
+    count = int(sys.argv[1]) if sys.argv[1:] else 10**4
+    asyncio.run(run(count))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+# Benchmark comparing the JSON (base64) and binary message codecs on FileServer-style
+# write requests carrying a large data field.
+#
+# Usage: python utils/bench_codec.py [data size] [messages]
+
+import os
+import sys
+from time import perf_counter_ns as tick
+
+from issp import BinaryCodec, Codec, JSONCodec, JSONMessage, log
+
+
+def bench(desc: str, codec: Codec, msgs: list[JSONMessage]) -> None:
+    start = tick()
+    encoded = [codec.encode(msg) for msg in msgs]
+    encode_time = tick() - start
+    start = tick()
+    for data in encoded:
+        codec.decode(data)
+    decode_time = tick() - start
+    log.info(
+        "%s: %d B/message, encode %.0f μs/message, decode %.0f μs/message",
+        desc,
+        len(encoded[0]),
+        encode_time / len(msgs) / 10**3,
+        decode_time / len(msgs) / 10**3,
+    )
+
+
+def main() -> None:
+    args = sys.argv[1:]
+    size = int(args[0]) if args[0:] else 2**20
+    count = int(args[1]) if args[1:] else 100
+    msgs = [
+        {
+            "action": "write",
+            "user": "alice",
+            "path": f"/home/alice/file{i}",
+            "data": os.urandom(size),
+            "overwrite": "true",
+        }
+        for i in range(count)
+    ]
+    bench("JSON", JSONCodec(), msgs)
+    bench("Binary", BinaryCodec(), msgs)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+# Benchmark comparing HMAC computations that key a fresh context on every call (the
+# previous behavior of hmac_sha1 and hmac_sha256) against the cached keyed contexts.
+#
+# Usage: python utils/bench_hmac.py [calls]
+
+import os
+import sys
+from collections.abc import Callable
+from time import perf_counter_ns as tick
+
+from cryptography.hazmat.primitives import hashes, hmac
+
+from issp import hmac_sha1, hmac_sha256, log
+
+
+def hmac_uncached(data: bytes, key: bytes, algorithm: hashes.HashAlgorithm) -> bytes:
+    mac = hmac.HMAC(key, algorithm)
+    mac.update(data)
+    return mac.finalize()
+
+
+def bench(desc: str, messages: list[bytes], func: Callable[[bytes], bytes]) -> int:
+    start = tick()
+    for message in messages:
+        func(message)
+    elapsed = tick() - start
+    log.info("%s: %.0f ns/call", desc, elapsed / len(messages))
+    return elapsed
+
+
+def compare(
+    desc: str,
+    func: Callable[[bytes, bytes], bytes],
+    algorithm: hashes.HashAlgorithm,
+    messages: list[bytes],
+    key: bytes,
+) -> None:
+    before = bench(f"{desc} (fresh context)", messages, lambda m: hmac_uncached(m, key, algorithm))
+    after = bench(f"{desc} (cached context)", messages, lambda m: func(m, key))
+    log.info("%s speedup: %.1fx", desc, before / after)
+
+
+def main() -> None:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10**6
+    # HOTP-style messages: 8-byte counters under a fixed key.
+    messages = [i.to_bytes(8) for i in range(count)]
+    key = os.urandom(20)
+    compare("HMAC-SHA1", hmac_sha1, hashes.SHA1(), messages, key)  # noqa: S303
+    compare("HMAC-SHA256", hmac_sha256, hashes.SHA256(), messages, key)
+
+
+if __name__ == "__main__":
+    main()